@@ -0,0 +1,98 @@
+import threading
+import time
+
+from responses import SENSOR_ERROR
+
+
+class DeviceState:
+    """Состояние адаптивного опроса одного устройства"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.timestamp = None
+        self.value = None
+        self.rate = 0.0
+        self.thresholds = None
+        self.thresholds_time = None
+
+
+class AdaptivePolicy:
+    """Интервал опроса по динамике температуры и близости к порогам
+
+    Пока температура меняется или близка к порогам Low/High (команда 9),
+    устройство опрашивается часто; пока значение стабильно, интервал
+    растет в backoff раз за опрос. Интервал всегда лежит в [floor, ceiling].
+
+    step - изменение температуры, которое допустимо пропустить между
+    опросами: при скорости rate интервал не больше step / rate. margin -
+    расстояние до порога, ближе которого опрос идет с частотой floor; при
+    приближении к порогу опрос успевает пройти хотя бы дважды до его
+    пересечения. Состояние хранится отдельно по каждому ключу (устройству).
+    """
+
+    def __init__(self, floor=5, ceiling=120, backoff=2.0, step=0.5, margin=2.0, thresholds_ttl=300):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.backoff = backoff
+        self.step = step
+        self.margin = margin
+        self.thresholds_ttl = thresholds_ttl
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def state(self, key):
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = DeviceState(self.floor)
+        return state
+
+    def interval(self, key):
+        with self.lock:
+            return self.state(key).interval
+
+    def thresholds_stale(self, key):
+        """Нужно ли перечитать пороги устройства командой 9"""
+        with self.lock:
+            state = self.state(key)
+            return state.thresholds_time is None or \
+                time.monotonic() - state.thresholds_time >= self.thresholds_ttl
+
+    def set_thresholds(self, key, thresholds):
+        """Пороги (low, high) устройства; None - пороги не прочитаны"""
+        with self.lock:
+            state = self.state(key)
+            if thresholds is not None:
+                state.thresholds = thresholds
+            state.thresholds_time = time.monotonic()
+
+    def update(self, key, timestamp, value):
+        """Учет нового отсчета; возвращает интервал до следующего опроса"""
+        with self.lock:
+            state = self.state(key)
+            if value is None or value == SENSOR_ERROR:
+                # Ответа нет или датчик неисправен - проверяем чаще
+                state.interval = self.floor
+                return state.interval
+
+            if state.value is None:
+                interval = self.floor
+                state.rate = 0.0
+            else:
+                elapsed = timestamp - state.timestamp
+                state.rate = abs(value - state.value) / elapsed if elapsed > 0 else 0.0
+                interval = min(self.ceiling, state.interval * self.backoff)
+                if state.rate > 0:
+                    interval = min(interval, self.step / state.rate)
+
+            if state.thresholds is not None:
+                low, high = state.thresholds
+                distance = min(value - low, high - value)
+                if distance <= self.margin:
+                    interval = self.floor
+                elif state.rate > 0:
+                    interval = min(interval, (distance - self.margin) / state.rate / 2)
+
+            state.timestamp = timestamp
+            state.value = value
+            state.interval = max(self.floor, min(self.ceiling, interval))
+            return state.interval
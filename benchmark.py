@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+from collector import ShardedCollector
+from device import TelnetClient
+from fleet import Device
+from monitor import Monitor
+from responses import parse_response
+from session import SessionManager
+from simulator import Simulator, SimulatorConfig
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Сводка по выборке: min/mean/max и перцентили (в миллисекундах)"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {
+        "count": len(ordered),
+        "min_ms": ordered[0] * 1000,
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+    for p in points:
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        summary[f"p{p}_ms"] = ordered[index] * 1000
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def connect_clients(host, ports):
+    clients = []
+    for port in ports:
+        client = TelnetClient()
+        client.connect(host, port)
+        clients.append(client)
+    return clients
+
+
+def bench_connect(host, ports):
+    """Время подключения (TCP + приветствие до промпта)"""
+    times = []
+    for port in ports:
+        client = TelnetClient()
+        client.connect(host, port)
+        if client.connected:
+            times.append(client.last_connect_time)
+        client.disconnect()
+    return {"connect": percentiles(times), "failed": len(ports) - len(times)}
+
+
+def bench_latency(host, port, commands):
+    """Задержка команды 3 и пропускная способность одного соединения"""
+    client = TelnetClient()
+    client.connect(host, port)
+    times = []
+    start = time.perf_counter()
+    for _ in range(commands):
+        t = time.perf_counter()
+        client.send_command("3")
+        times.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    client.disconnect()
+    return {"rtt": percentiles(times), "commands_per_sec": commands / elapsed}
+
+
+def bench_pipelined(host, port, commands, batch):
+    """Пропускная способность одного соединения при пакетной отправке"""
+    client = TelnetClient()
+    client.connect(host, port)
+    start = time.perf_counter()
+    sent = 0
+    while sent < commands:
+        size = min(batch, commands - sent)
+        client.send_commands(["3"] * size)
+        sent += size
+    elapsed = time.perf_counter() - start
+    client.disconnect()
+    return {"batch": batch, "commands_per_sec": commands / elapsed}
+
+
+def bench_parallel(host, ports, commands):
+    """Суммарная пропускная способность N соединений, по потоку на соединение"""
+    clients = connect_clients(host, ports)
+    times = [[] for _ in clients]
+
+    def run(client, sink):
+        for _ in range(commands):
+            t = time.perf_counter()
+            client.send_command("3")
+            sink.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=run, args=(c, s)) for c, s in zip(clients, times)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.disconnect()
+    total = sum(len(t) for t in times)
+    return {
+        "connections": len(clients),
+        "commands_per_sec": total / elapsed,
+        "per_connection_per_sec": total / elapsed / max(1, len(clients)),
+        "rtt": percentiles([x for t in times for x in t]),
+    }
+
+
+def bench_polling(host, port, interval, duration):
+    """Отклонение моментов опроса Monitor от расписания polling_interval"""
+    session = SessionManager(TelnetClient())
+    session.start(host, port)
+    stamps = []
+
+    def send(command):
+        stamps.append(time.monotonic())
+        return session.send_command(command)
+
+    monitor = Monitor(session, interval, send=send)
+    monitor.start()
+    time.sleep(duration)
+    monitor.stop()
+    session.stop()
+
+    if len(stamps) < 2:
+        return {"samples": len(stamps)}
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    drift = [stamp - (stamps[0] + i * interval) for i, stamp in enumerate(stamps)]
+    return {
+        "samples": len(stamps),
+        "interval_s": interval,
+        "gap_error": percentiles([abs(g - interval) for g in gaps]),
+        "final_drift_ms": drift[-1] * 1000,
+        "max_abs_drift_ms": max(abs(d) for d in drift) * 1000,
+    }
+
+
+def check_reply_order(config, commands, timeout, welcome_timeout):
+    """Доля ответов, не подходящих по формату к своей команде
+
+    После команды без ответа клиент переподключается; ответ, не
+    распознанный для своей команды, считается ошибкой сопоставления.
+    """
+    simulator = Simulator(1, "127.0.0.1", 0, config)
+    port = simulator.start_in_thread()[0]
+    client = TelnetClient(welcome_timeout=welcome_timeout)
+    client.timeout = timeout
+    sequence = ("3", "11", "9")
+    mismatched = timeouts = 0
+    try:
+        client.connect("127.0.0.1", port)
+        for i in range(commands):
+            if not client.connected:
+                client.connect("127.0.0.1", port)
+            command = sequence[i % len(sequence)]
+            response = client.send_command(command, use_cache=False)
+            if response.startswith("Ошибка"):
+                timeouts += 1
+            elif parse_response(command, response) is None:
+                mismatched += 1
+        client.disconnect()
+    finally:
+        simulator.stop_thread()
+    return {"commands": commands, "timeouts": timeouts, "mismatched": mismatched}
+
+
+def check_silent_replies(silent_rate=0.2, commands=300, timeout=0.3):
+    """Устройство иногда молчит: ответы не должны сдвигаться на команду"""
+    return check_reply_order(SimulatorConfig(silent_rate=silent_rate, seed=7), commands, timeout, timeout)
+
+
+def check_slow_welcome(welcome_delay=1.0, welcome_timeout=0.5, commands=30):
+    """Промпт приветствия приходит после welcome_timeout
+
+    Запоздавший промпт должен закрыть приветствие, а не стать ответом
+    первой команды.
+    """
+    return check_reply_order(SimulatorConfig(welcome_delay=welcome_delay, seed=7), commands,
+                             welcome_delay + 1.0, welcome_timeout)
+
+
+def bench_collector(host, ports, workers, interval, duration):
+    """Пропускная способность ShardedCollector при заданном числе процессов"""
+    devices = [Device(f"{host}:{port}", host, port, interval) for port in ports]
+    collector = ShardedCollector(devices, workers)
+    received = [0]
+
+    def on_sample(sample):
+        received[0] += 1
+
+    start = time.perf_counter()
+    collector.run(on_sample, duration=duration)
+    elapsed = time.perf_counter() - start
+    return {
+        "workers": collector.count,
+        "samples_per_sec": received[0] / elapsed,
+        "restarts": sum(w.restart_count for w in collector.workers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк задержки, пропускной способности и опроса")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, help="внешний имитатор; по умолчанию запускается свой")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа имитатора, с")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--poll-duration", type=float, default=10.0)
+    parser.add_argument("--collector-duration", type=float, default=0,
+                        help="замер многопроцессного сборщика, с (0 - не выполнять)")
+    parser.add_argument("--collector-interval", type=float, default=0.1)
+    parser.add_argument("--output", help="файл JSON с результатами (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    simulator = None
+    if args.base_port is None:
+        config = SimulatorConfig(latency=args.latency, jitter=args.jitter, seed=1)
+        simulator = Simulator(args.connections, args.host, 0, config)
+        ports = simulator.start_in_thread()
+    else:
+        ports = [args.base_port + i for i in range(args.connections)]
+
+    results = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "params": vars(args),
+        "in_process_simulator": simulator is not None,
+    }
+    try:
+        results["connect"] = bench_connect(args.host, ports)
+        results["latency"] = bench_latency(args.host, ports[0], args.commands)
+        results["pipelined"] = bench_pipelined(args.host, ports[0], args.commands, args.batch)
+        results["parallel"] = bench_parallel(args.host, ports, max(1, args.commands // 10))
+        results["polling"] = bench_polling(args.host, ports[0], args.poll_interval, args.poll_duration)
+        results["silent_check"] = check_silent_replies()
+        results["slow_welcome_check"] = check_slow_welcome()
+        if args.collector_duration > 0:
+            # Имитатор в этом же процессе сам ограничивает результат, для
+            # оценки масштабирования нужен внешний имитатор (--base-port)
+            results["collector"] = [
+                bench_collector(args.host, ports, workers, args.collector_interval, args.collector_duration)
+                for workers in sorted({1, os.cpu_count() or 1})
+            ]
+    finally:
+        if simulator:
+            simulator.stop_thread()
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if results["silent_check"]["mismatched"] or results["slow_welcome_check"]["mismatched"]:
+        sys.exit("Ошибка: ответы сопоставлены не тем командам")
+
+
+if __name__ == "__main__":
+    main()
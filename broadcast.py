@@ -0,0 +1,142 @@
+import asyncio
+import collections
+import time
+
+from fleet import DeviceSession
+from responses import parse_ack, parse_network, parse_thresholds
+
+
+Step = collections.namedtuple("Step", "command response ok")
+DeviceResult = collections.namedtuple("DeviceResult", "device ok steps error elapsed")
+
+
+class ConfigPlan:
+    """Набор настроек для рассылки по парку
+
+    thresholds - пара (low, high) для команды 8 с проверкой чтением 9,
+    fan_mode - "auto" (команда 4) или "manual" (команда 5),
+    network - словарь {имя устройства: (ip, gateway)} для команды 10
+    с проверкой чтением 11.
+    """
+
+    def __init__(self, thresholds=None, fan_mode=None, network=None):
+        self.thresholds = thresholds
+        self.fan_mode = fan_mode
+        self.network = network or {}
+
+    def commands(self, device):
+        """Пары (команда записи, команда проверки или None) для устройства"""
+        commands = []
+        if self.fan_mode == "auto":
+            commands.append(("4", None))
+        elif self.fan_mode == "manual":
+            commands.append(("5", None))
+        if self.thresholds:
+            low, high = self.thresholds
+            commands.append((f"8 {low:g} {high:g}", "9"))
+        if device.name in self.network:
+            ip, gateway = self.network[device.name]
+            commands.append((f"10 {ip} {gateway}", "11"))
+        return commands
+
+    def verify(self, device, command, response):
+        """Сравнение прочитанного значения с записанным"""
+        if command == "9":
+            thresholds = parse_thresholds(response)
+            return thresholds is not None and tuple(thresholds) == tuple(map(float, self.thresholds))
+        if command == "11":
+            settings = parse_network(response)
+            return settings is not None and tuple(settings) == tuple(self.network[device.name])
+        return False
+
+
+async def apply_device(device, plan, timeout=5, retries=1):
+    """Запись настроек на одно устройство и проверка чтением"""
+    start = time.monotonic()
+    pairs = plan.commands(device)
+    if not pairs:
+        # Пустой пакет нечего проверять, успехом это не считается
+        return DeviceResult(device.name, False, [], "Нет настроек для устройства", 0.0)
+    error = None
+    for attempt in range(retries + 1):
+        session = DeviceSession(device, timeout)
+        try:
+            await session.connect()
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            error = f"Ошибка подключения: {str(e) or type(e).__name__}"
+            await session.close()
+            continue
+        except Exception:
+            await session.close()
+            raise
+        try:
+            # Записи и проверочные чтения уходят одним пакетом
+            commands = []
+            for write, check in pairs:
+                commands.append(write)
+                if check:
+                    commands.append(check)
+            responses = dict(zip(commands, await session.send_commands(commands)))
+        finally:
+            await session.close()
+
+        steps = []
+        for write, check in pairs:
+            steps.append(Step(write, responses[write], parse_ack(responses[write]) is True))
+            if check:
+                response = responses[check]
+                steps.append(Step(check, response, plan.verify(device, check, response)))
+        if any(step.response.startswith("Ошибка") for step in steps) and attempt < retries:
+            error = "Ошибка связи при записи"
+            continue
+        ok = all(step.ok for step in steps)
+        return DeviceResult(device.name, ok, steps, None, time.monotonic() - start)
+    return DeviceResult(device.name, False, [], error, time.monotonic() - start)
+
+
+async def broadcast(devices, plan, concurrency=100, timeout=5, retries=1, on_result=None):
+    """Параллельная рассылка настроек с ограничением числа одновременных сессий"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(device):
+        async with slots:
+            start = time.monotonic()
+            try:
+                result = await apply_device(device, plan, timeout, retries)
+            except Exception as e:
+                # Непредвиденная ошибка (например, LimitOverrunError из
+                # readuntil) - отказ одного устройства, а не всей рассылки
+                result = DeviceResult(device.name, False, [], f"Ошибка: {str(e) or type(e).__name__}",
+                                      time.monotonic() - start)
+        if on_result:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*(run(device) for device in devices))
+
+
+def summarize(results, elapsed=None):
+    """Сводный отчет: число успешных и неудачных устройств и причины отказов"""
+    failures = []
+    for result in results:
+        if result.ok:
+            continue
+        reason = result.error or "; ".join(
+            f"{step.command}: {step.response}" for step in result.steps if not step.ok
+        )
+        failures.append({"device": result.device, "reason": reason})
+    report = {
+        "devices": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "failures": failures,
+    }
+    if elapsed is not None:
+        report["elapsed_s"] = round(elapsed, 3)
+    return report
+
+
+def run_broadcast(devices, plan, concurrency=100, timeout=5, retries=1, on_result=None):
+    start = time.monotonic()
+    results = asyncio.run(broadcast(devices, plan, concurrency, timeout, retries, on_result))
+    return results, summarize(results, time.monotonic() - start)
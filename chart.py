@@ -0,0 +1,153 @@
+import array
+import math
+
+
+class RingBuffer:
+    """Кольцевой буфер отсчетов (время, значение) фиксированного размера
+
+    Отсчеты добавляются в порядке времени; при заполнении вытесняются
+    самые старые. Поиск по времени - бинарный, без копирования буфера.
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.times = array.array("d", bytes(8 * capacity))
+        self.values = array.array("d", bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        end = (self.start + self.count) % self.capacity
+        self.times[end] = timestamp
+        self.values[end] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def extend(self, points):
+        for timestamp, value in points:
+            self.append(timestamp, value)
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    def time(self, index):
+        return self.times[(self.start + index) % self.capacity]
+
+    def point(self, index):
+        position = (self.start + index) % self.capacity
+        return self.times[position], self.values[position]
+
+    def points(self):
+        for index in range(self.count):
+            yield self.point(index)
+
+    def bisect(self, timestamp):
+        """Номер первого отсчета со временем не меньше timestamp"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class Downsampler:
+    """LTTB по корзинам, выровненным по времени, с кэшем готовых корзин
+
+    Корзина - интервал времени ширины width, кратный width от начала эпохи,
+    поэтому при сдвиге окна корзины не меняются. Из корзины берется точка,
+    образующая наибольший треугольник с выбранной точкой предыдущей корзины
+    и средним следующей. Выбор зависит от соседних корзин, так что
+    кэшируются только корзины, за которыми уже есть полная корзина; новые
+    отсчеты пересчитывают лишь последние две. Ширина округляется вверх до сетки 2 ** (k / GRID_STEPS),
+    чтобы растущее окно "вся история" не сбрасывало кэш на каждом отсчете;
+    шаг сетки ~19%, так что точек выходит не меньше ~84% ширины в пикселях.
+    """
+
+    GRID_STEPS = 4
+
+    def __init__(self):
+        self.width = None
+        self.cache = {}
+
+    def reset(self):
+        self.width = None
+        self.cache.clear()
+
+    def bucket_width(self, span, pixels):
+        raw = max(span / max(1, pixels), 1e-3)
+        # Небольшой допуск, чтобы ширина ровно на узле сетки не уходила на шаг вверх
+        step = math.ceil(math.log2(raw) * self.GRID_STEPS - 1e-9)
+        return 2.0 ** (step / self.GRID_STEPS)
+
+    def points(self, buffer, start, end, pixels):
+        """Точки буфера в [start, end], не больше одной на корзину (~пиксель)"""
+        first_index = buffer.bisect(start)
+        last_index = buffer.bisect(end + 1e-9)
+        if last_index - first_index <= 2 * pixels:
+            return [buffer.point(i) for i in range(first_index, last_index)]
+
+        width = self.bucket_width(end - start, pixels)
+        if width != self.width:
+            self.cache.clear()
+            self.width = width
+        first_bucket = math.floor(start / width)
+        last_bucket = math.floor(buffer.time(last_index - 1) / width)
+        for bucket in [b for b in self.cache if b < first_bucket]:
+            del self.cache[bucket]
+
+        # Границы непустых корзин в буфере
+        buckets = []
+        index = first_index
+        while index < last_index:
+            bucket = math.floor(buffer.time(index) / width)
+            end_index = buffer.bisect((bucket + 1) * width)
+            end_index = min(max(end_index, index + 1), last_index)
+            buckets.append((bucket, index, end_index))
+            index = end_index
+
+        sampled = []
+        previous = None
+        for position, (bucket, lo, hi) in enumerate(buckets):
+            # Первая корзина обрезана началом окна и всегда пересчитывается
+            cached = self.cache.get(bucket) if position else None
+            if cached is not None:
+                previous = cached
+                sampled.append(cached)
+                continue
+            if previous is None:
+                choice = buffer.point(lo)
+            elif position + 1 == len(buckets):
+                choice = buffer.point(hi - 1)
+            else:
+                _, next_lo, next_hi = buckets[position + 1]
+                count = next_hi - next_lo
+                avg_t = avg_v = 0.0
+                for i in range(next_lo, next_hi):
+                    t, v = buffer.point(i)
+                    avg_t += t
+                    avg_v += v
+                avg_t /= count
+                avg_v /= count
+                at, av = previous
+                best_area = -1.0
+                for i in range(lo, hi):
+                    t, v = buffer.point(i)
+                    area = abs((at - avg_t) * (v - av) - (at - t) * (avg_v - av))
+                    if area > best_area:
+                        best_area = area
+                        choice = (t, v)
+            # Корзина окончательна, если следующая за ней тоже завершена
+            if position and position + 2 < len(buckets) and buckets[position + 1][0] < last_bucket:
+                self.cache[bucket] = choice
+            previous = choice
+            sampled.append(choice)
+        return sampled
@@ -0,0 +1,289 @@
+import argparse
+import json
+import sys
+
+from adaptive import AdaptivePolicy
+from device import TelnetClient
+from log_writer import LogWriter, console_line
+from monitor import Monitor
+from recording import ChangeRecorder
+from responses import parse_temperature
+from sample_store import SampleStore
+from session import SessionManager
+
+
+def load_fleet(path):
+    """Список устройств из JSON: [{"name", "host", "port", "interval"}, ...]
+
+    Допускается и объект вида {"devices": [...]}.
+    """
+    from fleet import Device
+
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if isinstance(config, dict):
+        config = config["devices"]
+    devices = []
+    for entry in config:
+        host = entry["host"]
+        port = int(entry.get("port", 23))
+        devices.append(Device(
+            entry.get("name", f"{host}:{port}"),
+            host,
+            port,
+            float(entry.get("interval", 10))
+        ))
+    return devices
+
+
+def make_recorder(args):
+    if not args.changes_only:
+        return None
+    return ChangeRecorder(args.deadband, args.heartbeat)
+
+
+def make_adaptive(args):
+    if not args.adaptive:
+        return None
+    return AdaptivePolicy(args.floor, args.ceiling)
+
+
+def cmd_connect(args):
+    client = TelnetClient(welcome_timeout=args.timeout)
+    result = client.connect(args.host, args.port)
+    if not client.connected:
+        print(f"Ошибка подключения: {result}", file=sys.stderr)
+        return 1
+    print(result)
+    print(f"Подключено за {client.last_connect_time:.3f} с", file=sys.stderr)
+    client.disconnect()
+    return 0
+
+
+def cmd_command(args):
+    client = TelnetClient(welcome_timeout=args.timeout)
+    result = client.connect(args.host, args.port)
+    if not client.connected:
+        print(f"Ошибка подключения: {result}", file=sys.stderr)
+        return 1
+    responses = client.send_commands(args.commands, timeout=args.timeout)
+    client.disconnect()
+    for command, response in zip(args.commands, responses):
+        print(f"{command}: {response}")
+    return 1 if any(r.startswith("Ошибка") for r in responses) else 0
+
+
+def log_error(error):
+    """Ошибка записи лога (из потока LogWriter)"""
+    print(f"Ошибка записи в лог: {str(error)}", file=sys.stderr, flush=True)
+
+
+def cmd_monitor(args):
+    log_writer = None
+    if args.log_dir:
+        log_writer = LogWriter("temperature_log", directory=args.log_dir,
+                               flush_interval=args.flush_interval, on_error=log_error)
+
+    def log(message):
+        line = console_line(message)
+        print(line, flush=True)
+        if log_writer:
+            log_writer.write(line)
+
+    def send(command):
+        response = session.send_command(command)
+        log(f"Ответ: {response}")
+        return response
+
+    store = SampleStore(args.store) if args.store else None
+    session = SessionManager(TelnetClient(), on_event=log)
+    result = session.start(args.host, args.port)
+    if session.connected:
+        log(f"Успешно подключено к {args.host}:{args.port}")
+    else:
+        log(f"Ошибка подключения: {result}")
+
+    monitor = Monitor(session, args.interval, log_writer=log_writer, sample_store=store, send=send,
+                      recorder=make_recorder(args), adaptive=make_adaptive(args))
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        log("Мониторинг температуры остановлен")
+    finally:
+        monitor.stop()
+        session.stop()
+        if log_writer:
+            log_writer.close()
+        if store:
+            store.close()
+    return 0
+
+
+def cmd_fleet(args):
+    import asyncio
+
+    from fleet import FleetPoller
+
+    devices = load_fleet(args.config)
+    store = SampleStore(args.store) if args.store else None
+    log_writer = LogWriter("fleet_log", directory=args.log_dir, on_error=log_error) if args.log_dir else None
+    recorder = make_recorder(args)
+
+    def save(sample, value):
+        line = f"{sample.timestamp:.3f},{sample.device},{sample.response}"
+        if log_writer:
+            log_writer.write(line)
+        else:
+            print(line)
+        if store and value is not None:
+            store.append(sample.timestamp, sample.device, value)
+
+    def on_sample(sample):
+        value = parse_temperature(sample.response)
+        if recorder:
+            for record in recorder.offer(sample.device, sample.timestamp, value, (sample, value)):
+                save(*record)
+        else:
+            save(sample, value)
+
+    try:
+        if args.workers:
+            from collector import ShardedCollector
+
+            collector = ShardedCollector(
+                devices,
+                args.workers,
+                max_connecting=args.max_connecting,
+                timeout=args.timeout,
+                adaptive=(args.floor, args.ceiling) if args.adaptive else None,
+                on_event=lambda message: print(console_line(message), file=sys.stderr)
+            )
+            try:
+                collector.run(on_sample, duration=args.duration)
+            except RuntimeError as e:
+                print(console_line(f"Ошибка: {e}"), file=sys.stderr)
+                return 1
+        else:
+            poller = FleetPoller(devices, max_connecting=args.max_connecting, timeout=args.timeout,
+                                 adaptive=make_adaptive(args))
+            asyncio.run(poller.run(on_sample, duration=args.duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recorder:
+            for record in recorder.flush():
+                save(*record)
+        if log_writer:
+            log_writer.close()
+        if store:
+            store.close()
+    return 0
+
+
+def cmd_apply(args):
+    from broadcast import ConfigPlan, run_broadcast
+
+    devices = load_fleet(args.config)
+    network = None
+    if args.network:
+        with open(args.network, encoding="utf-8") as f:
+            network = {name: tuple(value) for name, value in json.load(f).items()}
+    plan = ConfigPlan(thresholds=args.thresholds, fan_mode=args.fan, network=network)
+    if not (args.thresholds or args.fan or network):
+        args.error("укажите хотя бы одну настройку: --thresholds, --fan или --network")
+    if not any(plan.commands(device) for device in devices):
+        args.error("ни одно устройство из списка не найдено в --network")
+
+    def on_result(result):
+        status = "OK" if result.ok else "ОШИБКА"
+        print(console_line(f"{result.device}: {status} за {result.elapsed:.2f} с"), file=sys.stderr)
+
+    _, report = run_broadcast(devices, plan, args.concurrency, args.timeout, args.retries, on_result)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0 if report["failed"] == 0 else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Работа с контроллерами без графического интерфейса")
+    parser.add_argument("--metrics-port", type=int,
+                        help="включить метрики и отдавать их на http://127.0.0.1:PORT/metrics")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def recording_args(sub):
+        sub.add_argument("--changes-only", action="store_true",
+                         help="сохранять только изменения значения")
+        sub.add_argument("--deadband", type=float, default=0.0,
+                         help="изменение, меньше которого значение считается прежним")
+        sub.add_argument("--heartbeat", type=float, default=300,
+                         help="контрольная запись не реже раза в столько секунд")
+
+    def adaptive_args(sub):
+        sub.add_argument("--adaptive", action="store_true",
+                         help="подбирать интервал опроса по динамике температуры и порогам")
+        sub.add_argument("--floor", type=float, default=5, help="минимальный интервал, с")
+        sub.add_argument("--ceiling", type=float, default=120, help="максимальный интервал, с")
+
+    def device_args(sub):
+        sub.add_argument("host")
+        sub.add_argument("--port", type=int, default=23)
+        sub.add_argument("--timeout", type=float, default=5)
+
+    sub = commands.add_parser("connect", help="подключиться и показать приветствие")
+    device_args(sub)
+    sub.set_defaults(handler=cmd_connect)
+
+    sub = commands.add_parser("cmd", help="выполнить команды и вывести ответы")
+    device_args(sub)
+    sub.add_argument("commands", nargs="+", help="команды, например: 3 \"8 20 30\" 9")
+    sub.set_defaults(handler=cmd_command)
+
+    sub = commands.add_parser("monitor", help="непрерывный опрос температуры")
+    device_args(sub)
+    sub.add_argument("--interval", type=float, default=10)
+    sub.add_argument("--log-dir", help="каталог для *_temperature_log.txt")
+    sub.add_argument("--flush-interval", type=float, default=1.0)
+    sub.add_argument("--store", help="базовое имя двоичного хранилища отсчетов")
+    recording_args(sub)
+    adaptive_args(sub)
+    sub.set_defaults(handler=cmd_monitor)
+
+    sub = commands.add_parser("fleet", help="опрос парка устройств из JSON-файла")
+    sub.add_argument("config")
+    sub.add_argument("--duration", type=float, help="время работы в секундах")
+    sub.add_argument("--max-connecting", type=int, default=50)
+    sub.add_argument("--timeout", type=float, default=5)
+    sub.add_argument("--log-dir", help="писать отсчеты в лог вместо stdout")
+    sub.add_argument("--workers", type=int,
+                     help="число процессов опроса (по умолчанию опрос в одном процессе)")
+    sub.add_argument("--store", help="базовое имя двоичного хранилища отсчетов")
+    recording_args(sub)
+    adaptive_args(sub)
+    sub.set_defaults(handler=cmd_fleet)
+
+    sub = commands.add_parser("apply", help="рассылка настроек по парку с проверкой чтением")
+    sub.add_argument("config", help="JSON со списком устройств")
+    sub.add_argument("--thresholds", nargs=2, type=float, metavar=("LOW", "HIGH"))
+    sub.add_argument("--fan", choices=("auto", "manual"))
+    sub.add_argument("--network", help="JSON {имя устройства: [ip, gateway]}")
+    sub.add_argument("--concurrency", type=int, default=100)
+    sub.add_argument("--timeout", type=float, default=5)
+    sub.add_argument("--retries", type=int, default=1)
+    sub.add_argument("--report", help="сохранить отчет в JSON")
+    sub.set_defaults(handler=cmd_apply, error=sub.error)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics_port:
+        import metrics
+        metrics.serve(args.metrics_port)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
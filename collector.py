@@ -0,0 +1,289 @@
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+
+from adaptive import AdaptivePolicy
+from fleet import FleetPoller, Sample
+
+
+def shard(devices, count):
+    """Разбиение списка устройств на count частей по кругу"""
+    shards = [[] for _ in range(count)]
+    for i, device in enumerate(devices):
+        shards[i % count].append(device)
+    return shards
+
+
+async def worker_loop(devices, conn, options):
+    """Цикл рабочего процесса: FleetPoller и отправка отсчетов пачками
+
+    Отсчеты уходят родителю кортежами (timestamp, device, response) не
+    реже раза в batch_interval секунд, даже пустой пачкой - она же служит
+    сигналом, что процесс жив. Из канала принимаются команды ("add",
+    устройства) и ("stop",).
+    """
+    adaptive = options.get("adaptive")
+    poller = FleetPoller(
+        devices,
+        command=options.get("command", "3"),
+        max_connecting=options.get("max_connecting", 50),
+        timeout=options.get("timeout", 5),
+        adaptive=AdaptivePolicy(*adaptive) if adaptive else None
+    )
+    await poller.start()
+
+    loop = asyncio.get_running_loop()
+    batch_size = options.get("batch_size", 500)
+    batch_interval = options.get("batch_interval", 0.2)
+    try:
+        while True:
+            batch = []
+            deadline = loop.time() + batch_interval
+            while len(batch) < batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    sample = await asyncio.wait_for(poller.samples.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(tuple(sample))
+            conn.send(("samples", batch, {"polled": poller.polled, "dropped": poller.dropped,
+                                          "devices": len(poller.devices)}))
+
+            # Команды родителя проверяются между пачками: add_reader для
+            # канала недоступен в цикле событий Windows
+            stop = False
+            while not stop and conn.poll():
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    # Родитель завершился
+                    message = ("stop",)
+                if message[0] == "add":
+                    poller.add(message[1])
+                elif message[0] == "stop":
+                    stop = True
+            if stop:
+                break
+    finally:
+        await poller.stop()
+
+
+def worker_main(devices, conn, options):
+    # Ctrl+C обрабатывает родитель и сам останавливает рабочие процессы
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(worker_loop(devices, conn, options))
+    except (BrokenPipeError, EOFError):
+        pass
+    finally:
+        conn.close()
+
+
+class Worker:
+    """Рабочий процесс и его часть парка с точки зрения родителя"""
+
+    def __init__(self, index, devices):
+        self.index = index
+        self.devices = list(devices)
+        self.process = None
+        self.conn = None
+        self.last_seen = None
+        self.restarts = []
+        self.restart_count = 0
+        # Время отложенного перезапуска; None - процесс работает
+        self.restart_at = None
+        self.retired = False
+        self.stats = {}
+
+
+class ShardedCollector:
+    """Опрос большого парка несколькими процессами
+
+    Устройства делятся между workers процессами, каждый из которых
+    опрашивает свою часть в собственном цикле asyncio (FleetPoller), так что
+    разбор ответов не упирается в GIL одного процесса. Отсчеты приходят
+    родителю пачками через Pipe.
+
+    Родитель следит за процессами: процесс, который завершился или дольше
+    health_timeout не присылал пачек, перезапускается со своей частью парка
+    с задержкой restart_delay, удваивающейся с каждым сбоем в пределах
+    restart_window (не больше max_restart_delay). Если за restart_window
+    секунд процесс падал больше max_restarts раз, он выводится из работы, а
+    его устройства распределяются по оставшимся процессам. Когда из работы
+    выведены все процессы, run останавливается с RuntimeError.
+    """
+
+    def __init__(self, devices, workers=None, command="3", max_connecting=200, timeout=5,
+                 adaptive=None, batch_size=500, batch_interval=0.2, health_timeout=10,
+                 max_restarts=3, restart_window=60, restart_delay=0.5, max_restart_delay=30,
+                 on_event=None):
+        self.devices = list(devices)
+        self.count = max(1, min(workers or os.cpu_count() or 1, len(self.devices) or 1))
+        self.options = {
+            "command": command,
+            "max_connecting": max(1, max_connecting // self.count),
+            "timeout": timeout,
+            "adaptive": adaptive,
+            "batch_size": batch_size,
+            "batch_interval": batch_interval,
+        }
+        self.health_timeout = health_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.on_event = on_event or (lambda message: None)
+        # spawn одинаково работает в Windows и Linux и не копирует потоки родителя
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = []
+        self.samples = 0
+
+    def spawn(self, worker):
+        parent_conn, child_conn = self.context.Pipe()
+        worker.process = self.context.Process(
+            target=worker_main,
+            args=(worker.devices, child_conn, self.options),
+            name=f"collector-{worker.index}"
+        )
+        worker.process.daemon = True
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+        worker.last_seen = time.monotonic()
+        worker.restart_at = None
+
+    def start(self):
+        self.workers = [Worker(i, devices) for i, devices in enumerate(shard(self.devices, self.count))]
+        for worker in self.workers:
+            self.spawn(worker)
+
+    def stop(self, timeout=5):
+        for worker in self.live():
+            try:
+                worker.conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self.live():
+            worker.process.join(max(0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+            worker.conn.close()
+
+    def live(self):
+        """Работающие процессы (без ожидающих перезапуска)"""
+        return [w for w in self.workers
+                if not w.retired and w.process is not None and w.restart_at is None]
+
+    def restart_due(self):
+        """Перезапуск процессов, у которых истекла задержка"""
+        now = time.monotonic()
+        for worker in self.workers:
+            if not worker.retired and worker.restart_at is not None and worker.restart_at <= now:
+                self.spawn(worker)
+
+    def handle_failure(self, worker, reason):
+        """Отложенный перезапуск упавшего процесса или передача его устройств другим"""
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join()
+        worker.conn.close()
+
+        now = time.monotonic()
+        worker.restarts = [t for t in worker.restarts if now - t < self.restart_window]
+        if len(worker.restarts) < self.max_restarts:
+            delay = min(self.max_restart_delay, self.restart_delay * 2 ** len(worker.restarts))
+            worker.restarts.append(now)
+            worker.restart_count += 1
+            worker.restart_at = now + delay
+            self.on_event(f"Процесс {worker.index}: {reason}, перезапуск через {delay:.1f} с")
+            return
+
+        worker.retired = True
+        survivors = [w for w in self.workers if not w.retired]
+        if not survivors:
+            self.on_event(f"Процесс {worker.index}: {reason}, работающих процессов не осталось")
+            raise RuntimeError("Все процессы сборщика выведены из работы после повторных сбоев")
+        self.on_event(f"Процесс {worker.index}: {reason}, устройства переданы другим процессам")
+        for target, devices in zip(survivors, shard(worker.devices, len(survivors))):
+            if not devices:
+                continue
+            target.devices.extend(devices)
+            if target.restart_at is not None:
+                # Список устройств процесс получит при перезапуске
+                continue
+            try:
+                target.conn.send(("add", devices))
+            except (BrokenPipeError, OSError):
+                # Этот процесс тоже упал; список устройств он получит при перезапуске
+                pass
+        worker.devices = []
+
+    def poll(self, on_sample, timeout):
+        """Прием пачек от процессов и проверка их состояния"""
+        self.restart_due()
+        waiting = [w.restart_at for w in self.workers if not w.retired and w.restart_at is not None]
+        if waiting:
+            timeout = max(0, min(timeout, min(waiting) - time.monotonic()))
+        workers = {}
+        for worker in self.live():
+            workers[worker.conn] = worker
+            workers[worker.process.sentinel] = worker
+        ready = multiprocessing.connection.wait(list(workers), timeout)
+
+        failed = {}
+        for handle in ready:
+            worker = workers[handle]
+            if handle is not worker.conn:
+                failed.setdefault(worker, "процесс завершился")
+                continue
+            try:
+                while worker.conn.poll():
+                    _, batch, stats = worker.conn.recv()
+                    worker.last_seen = time.monotonic()
+                    worker.stats = stats
+                    self.samples += len(batch)
+                    for sample in batch:
+                        on_sample(Sample(*sample))
+            except (EOFError, OSError):
+                failed.setdefault(worker, "канал закрыт")
+
+        now = time.monotonic()
+        for worker in self.live():
+            if worker not in failed and now - worker.last_seen > self.health_timeout:
+                failed[worker] = f"нет данных {now - worker.last_seen:.0f} с"
+        for worker, reason in failed.items():
+            self.handle_failure(worker, reason)
+
+    def run(self, on_sample, duration=None):
+        """Опрос парка с передачей каждого отсчета в on_sample"""
+        self.start()
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                timeout = 1.0 if deadline is None else min(1.0, max(0, deadline - time.monotonic()))
+                self.poll(on_sample, timeout)
+        finally:
+            self.stop()
+
+    def summary(self):
+        return {
+            "workers": [
+                {
+                    **w.stats,
+                    "index": w.index,
+                    "pid": w.process.pid if w.process else None,
+                    "devices": len(w.devices),
+                    "restarts": w.restart_count,
+                    "retired": w.retired,
+                }
+                for w in self.workers
+            ],
+            "samples": self.samples,
+        }
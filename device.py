@@ -0,0 +1,158 @@
+import threading
+import time
+
+import transport
+from metrics import metrics
+from responses import ResponseCache, command_code, parse_response
+
+
+# Результат команды, на которую устройство не ответило за timeout
+NO_REPLY = "Ошибка: нет ответа"
+
+
+class TelnetClient:
+    def __init__(self, welcome_timeout=5, cache_ttl=5.0):
+        self.conn = None
+        self.connected = False
+        self.lock = threading.Lock()
+        self.timeout = 5
+        self.welcome_timeout = welcome_timeout
+        self.last_connect_time = None
+        self.cache = ResponseCache(cache_ttl)
+
+    def connect(self, host, port):
+        if self.conn is not None:
+            self.conn.shutdown()
+        # После переподключения устройство могло перезагрузиться
+        self.cache.clear()
+        start = time.monotonic()
+        try:
+            self.conn = transport.open_connection(host, port, timeout=self.timeout)
+        except Exception as e:
+            self.connected = False
+            if metrics.enabled:
+                metrics.observe_connect(time.monotonic() - start, ok=False)
+            return str(e)
+        tcp_time = time.monotonic() - start
+        # Читаем приветственное сообщение полностью
+        welcome = self.read_full_welcome(self.welcome_timeout)
+        self.last_connect_time = time.monotonic() - start
+        if metrics.enabled:
+            metrics.observe_connect(tcp_time, self.last_connect_time - tcp_time,
+                                    complete=self.conn.welcome.done())
+        self.connected = True
+        return welcome
+
+    def read_full_welcome(self, timeout=5):
+        """Чтение приветственного сообщения до промпта '>'
+
+        Возврат происходит сразу по приходу промпта; если за timeout промпт
+        не пришел, возвращается принятая часть сообщения.
+        """
+        try:
+            welcome = self.conn.wait_reply(self.conn.welcome, timeout)
+        except Exception:
+            # Соединение закрыто во время приветствия (устройством или из-за
+            # ошибки в цикле транспорта); обрыв заметит первая же команда
+            welcome = self.conn.parser.partial()
+        return welcome.decode('ascii', errors='replace').strip()
+
+    def disconnect(self):
+        if self.connected:
+            self.conn.shutdown()
+            self.connected = False
+
+    def send_command(self, command, use_cache=True):
+        if use_cache:
+            cached = self.cache.get(command)
+            if cached is not None:
+                return cached
+        self.cache.invalidate(command)
+        response = self.send_command_uncached(command)
+        self.cache.put(command, response)
+        return response
+
+    def query(self, command, use_cache=True):
+        """Типизированный ответ (Temperature, Thresholds, NetworkSettings, bool) или None"""
+        return parse_response(command, self.send_command(command, use_cache))
+
+    def send_command_uncached(self, command):
+        if metrics.enabled:
+            return self.send_command_measured(command)
+        with self.lock:
+            if not self.connected:
+                return "Не подключено"
+            # Запись и ожидание идут в потоке транспорта, здесь только очередь
+            future = self.conn.submit(command.encode('ascii') + b'\r\n')
+        try:
+            response = self.conn.wait_reply(future, self.timeout)
+            return response.decode('ascii', errors='replace').strip()
+        except TimeoutError:
+            self.connected = False
+            return NO_REPLY
+        except Exception as e:
+            self.connected = False
+            return f"Ошибка: {str(e)}"
+
+    def send_command_measured(self, command):
+        """send_command с записью задержки, ожидания блокировки и исходов"""
+        code = command_code(command)
+        start = time.perf_counter()
+        with self.lock:
+            metrics.observe_lock_wait(time.perf_counter() - start)
+            if not self.connected:
+                metrics.observe_command(code, 0.0, "error")
+                return "Не подключено"
+            future = self.conn.submit(command.encode('ascii') + b'\r\n')
+        metrics.add_inflight(1)
+        try:
+            response = self.conn.wait_reply(future, self.timeout)
+            outcome = "ok"
+            return response.decode('ascii', errors='replace').strip()
+        except TimeoutError:
+            outcome = "timeout"
+            self.connected = False
+            return NO_REPLY
+        except Exception as e:
+            outcome = "error"
+            self.connected = False
+            return f"Ошибка: {str(e)}"
+        finally:
+            metrics.add_inflight(-1)
+            metrics.observe_command(code, time.perf_counter() - start, outcome)
+
+    def send_commands(self, commands, timeout=None):
+        """Конвейерная отправка нескольких команд с ответами в том же порядке
+
+        Все команды пишутся в сокет подряд без ожидания промпта, ответы
+        сопоставляются по порядку. Таймаут действует на каждую команду
+        отдельно; команда без ответа нарушает порядок ответов, поэтому
+        соединение закрывается, и оставшиеся команды тоже получают ошибку.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        for command in commands:
+            self.cache.invalidate(command)
+        with self.lock:
+            if not self.connected:
+                return ["Не подключено"] * len(commands)
+            futures = self.conn.submit_batch([c.encode('ascii') + b'\r\n' for c in commands])
+        start = time.perf_counter()
+        results = []
+        for command, future in zip(commands, futures):
+            try:
+                response = self.conn.wait_reply(future, timeout)
+                results.append(response.decode('ascii', errors='replace').strip())
+                self.cache.put(command, results[-1])
+                outcome = "ok"
+            except TimeoutError:
+                self.connected = False
+                results.append(NO_REPLY)
+                outcome = "timeout"
+            except Exception as e:
+                self.connected = False
+                results.append(f"Ошибка: {str(e)}")
+                outcome = "error"
+            if metrics.enabled:
+                metrics.observe_command(command_code(command), time.perf_counter() - start, outcome)
+        return results
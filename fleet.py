@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import random
+import time
+
+from metrics import metrics
+from responses import command_code, parse_temperature, parse_thresholds
+
+
+Device = collections.namedtuple("Device", "name host port interval", defaults=(23, 10))
+Sample = collections.namedtuple("Sample", "timestamp device response")
+
+
+class DeviceSession:
+    """Асинхронная сессия с одним контроллером"""
+
+    def __init__(self, device, timeout=5):
+        self.device = device
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.connected = False
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.device.host, self.device.port),
+                self.timeout
+            )
+            tcp_time = loop.time() - start
+            # Приветствие заканчивается промптом '>'
+            welcome = await asyncio.wait_for(self.reader.readuntil(b'>'), self.timeout)
+        except Exception:
+            if metrics.enabled:
+                metrics.observe_connect(loop.time() - start, ok=False)
+            raise
+        if metrics.enabled:
+            metrics.observe_connect(tcp_time, loop.time() - start - tcp_time)
+        self.connected = True
+        return welcome.decode('ascii', errors='replace').strip()
+
+    async def send_command(self, command):
+        if not self.connected:
+            if metrics.enabled:
+                metrics.observe_command(command_code(command), 0.0, "error")
+            return "Не подключено"
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            self.writer.write(command.encode('ascii') + b'\r\n')
+            await self.writer.drain()
+            data = await asyncio.wait_for(self.reader.readuntil(b'>'), self.timeout)
+            response = data.decode('ascii', errors='replace').strip()
+            if response.endswith('>'):
+                response = response[:-1].strip()
+            return response
+        except Exception as e:
+            outcome = "timeout" if isinstance(e, TimeoutError) else "error"
+            await self.close()
+            return f"Ошибка: {str(e) or type(e).__name__}"
+        finally:
+            if metrics.enabled:
+                metrics.observe_command(command_code(command), time.perf_counter() - start, outcome)
+
+    async def send_commands(self, commands):
+        """Конвейерная отправка команд: запись подряд, ответы по порядку
+
+        В метрики каждая команда попадает с задержкой от начала записи
+        пачки до получения ее ответа.
+        """
+        if not self.connected:
+            if metrics.enabled:
+                for command in commands:
+                    metrics.observe_command(command_code(command), 0.0, "error")
+            return ["Не подключено"] * len(commands)
+        start = time.perf_counter()
+        self.writer.write(b''.join(c.encode('ascii') + b'\r\n' for c in commands))
+        results = []
+        try:
+            await self.writer.drain()
+            for command in commands:
+                data = await asyncio.wait_for(self.reader.readuntil(b'>'), self.timeout)
+                results.append(data[:-1].decode('ascii', errors='replace').strip())
+                if metrics.enabled:
+                    metrics.observe_command(command_code(command), time.perf_counter() - start, "ok")
+        except Exception as e:
+            await self.close()
+            error = f"Ошибка: {str(e) or type(e).__name__}"
+            if metrics.enabled:
+                outcome = "timeout" if isinstance(e, TimeoutError) else "error"
+                elapsed = time.perf_counter() - start
+                for command in commands[len(results):]:
+                    metrics.observe_command(command_code(command), elapsed, outcome)
+            results += [error] * (len(commands) - len(results))
+        return results
+
+    async def close(self):
+        self.connected = False
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+
+class FleetPoller:
+    """Одновременный опрос температуры на множестве контроллеров в одном потоке
+
+    Каждое устройство опрашивается командой 3 по своему расписанию, результаты
+    попадают в общую ограниченную очередь samples. При переполнении очереди
+    самые старые отсчеты отбрасываются, поэтому память не растет. С adaptive
+    (AdaptivePolicy) интервал каждого устройства подбирается по динамике его
+    температуры вместо device.interval.
+    """
+
+    def __init__(self, devices, command="3", max_samples=10000, max_connecting=50,
+                 timeout=5, reconnect_delay=5, adaptive=None):
+        self.devices = list(devices)
+        self.command = command
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.adaptive = adaptive
+        self.samples = None
+        self.max_samples = max_samples
+        self.max_connecting = max_connecting
+        self.dropped = 0
+        self.polled = 0
+        self.sessions = {}
+        self.tasks = []
+        self.connect_slots = None
+
+    def publish(self, sample):
+        """Помещение отсчета в общий поток с вытеснением самого старого"""
+        if self.samples.full():
+            self.samples.get_nowait()
+            self.dropped += 1
+        self.polled += 1
+        self.samples.put_nowait(sample)
+
+    async def poll_device(self, device, connect_slots):
+        session = DeviceSession(device, self.timeout)
+        self.sessions[device.name] = session
+        loop = asyncio.get_running_loop()
+        # Случайная фаза, чтобы не опрашивать все устройства одновременно
+        next_time = loop.time() + random.uniform(0, device.interval)
+        while True:
+            if not session.connected:
+                try:
+                    async with connect_slots:
+                        await session.connect()
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    await session.close()
+                    self.publish(Sample(time.time(), device.name, f"Ошибка: {str(e) or type(e).__name__}"))
+                    await asyncio.sleep(self.reconnect_delay)
+                    continue
+
+            await asyncio.sleep(max(0, next_time - loop.time()))
+            if self.adaptive and self.adaptive.thresholds_stale(device.name):
+                thresholds = parse_thresholds(await session.send_command("9"))
+                self.adaptive.set_thresholds(device.name, thresholds)
+            response = await session.send_command(self.command)
+            sample = Sample(time.time(), device.name, response)
+            self.publish(sample)
+
+            interval = device.interval
+            if self.adaptive:
+                interval = self.adaptive.update(device.name, sample.timestamp, parse_temperature(response))
+            # Расписание без накопления дрейфа; пропущенные циклы не догоняем
+            next_time += interval
+            if next_time < loop.time():
+                next_time = loop.time() + interval
+
+    async def start(self):
+        self.samples = asyncio.Queue(self.max_samples)
+        self.connect_slots = asyncio.Semaphore(self.max_connecting)
+        self.tasks = [
+            asyncio.create_task(self.poll_device(device, self.connect_slots))
+            for device in self.devices
+        ]
+
+    def add(self, devices):
+        """Добавление устройств в уже запущенный опрос"""
+        for device in devices:
+            self.devices.append(device)
+            self.tasks.append(asyncio.create_task(self.poll_device(device, self.connect_slots)))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for session in self.sessions.values():
+            await session.close()
+
+    async def stream(self):
+        """Общий поток отсчетов со всех устройств"""
+        while True:
+            yield await self.samples.get()
+
+    async def run(self, on_sample, duration=None):
+        """Опрос парка с передачей каждого отсчета в on_sample"""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        deadline = None if duration is None else loop.time() + duration
+        try:
+            while deadline is None or loop.time() < deadline:
+                timeout = None if deadline is None else deadline - loop.time()
+                try:
+                    sample = await asyncio.wait_for(self.samples.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                on_sample(sample)
+        finally:
+            await self.stop()
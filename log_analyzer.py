@@ -0,0 +1,171 @@
+import argparse
+import glob
+import sys
+
+import numpy as np
+
+from log_writer import open_log
+
+
+WINDOWS = {"minute": 60, "hour": 3600, "day": 86400}
+# Показания ниже абсолютного нуля (например, -1000) - признак ошибки датчика
+MIN_VALID = -273.15
+
+
+def iter_samples(paths, encoding="cp1251"):
+    """Строки отсчетов (время, значение) из логов без загрузки файлов целиком
+
+    Из смешанного лога берутся только строки вида
+    '2025-09-18 11:46:19,Temperature: 22 C', консольные строки '[11:46:19] ...'
+    и ответы с ошибками пропускаются. Сжатые сегменты (.gz, .zst) читаются
+    без распаковки на диск.
+    """
+    for path in paths:
+        with open_log(path, encoding) as f:
+            for line in f:
+                if len(line) < 33 or line[19] != "," or not line.startswith("20"):
+                    continue
+                rest = line[20:]
+                if not rest.startswith("Temperature:"):
+                    continue
+                try:
+                    value = float(rest[12:].split()[0])
+                except (ValueError, IndexError):
+                    continue
+                yield line[:19], value
+
+
+def iter_chunks(samples, chunk_size=65536):
+    """Отсчеты пачками массивов NumPy: время (секунды) и значения"""
+    stamps = []
+    values = []
+    for stamp, value in samples:
+        stamps.append(stamp)
+        values.append(value)
+        if len(stamps) >= chunk_size:
+            yield np.array(stamps, dtype="datetime64[s]").astype(np.int64), np.array(values)
+            stamps = []
+            values = []
+    if stamps:
+        yield np.array(stamps, dtype="datetime64[s]").astype(np.int64), np.array(values)
+
+
+def fill_chunks(chunks, interval, max_gap=None):
+    """Восстановление ряда с шагом interval из лога только изменений
+
+    Каждое значение повторяется до следующего отсчета; промежутки длиннее
+    max_gap не заполняются. Последний отсчет пачки переносится в следующую,
+    так как длина его участка известна только по следующему отсчету.
+    """
+    last_stamp = np.empty(0, dtype=np.int64)
+    last_value = np.empty(0)
+    for stamps, values in chunks:
+        stamps = np.concatenate((last_stamp, stamps))
+        values = np.concatenate((last_value, values))
+        if not len(stamps):
+            continue
+        gaps = np.diff(stamps)
+        repeats = np.maximum(1, np.round(gaps / interval)).astype(np.int64)
+        if max_gap is not None:
+            repeats[gaps > max_gap] = 1
+        index = np.repeat(np.arange(len(repeats)), repeats)
+        offsets = np.arange(len(index)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        yield stamps[index] + (offsets * interval).astype(np.int64), values[index]
+        last_stamp, last_value = stamps[-1:], values[-1:]
+    if len(last_stamp):
+        yield last_stamp, last_value
+
+
+def window_stats(keys, values, percentiles):
+    """Статистика по окнам для массивов, упорядоченных по (окно, значение)"""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    ends = starts + counts - 1
+    stats = {
+        "window": keys[starts],
+        "count": counts,
+        "min": values[starts],
+        "max": values[ends],
+        "mean": np.add.reduceat(values, starts) / counts,
+    }
+    for p in percentiles:
+        # Линейная интерполяция внутри отсортированной группы, как в np.percentile
+        position = starts + (counts - 1) * (p / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, ends)
+        fraction = position - lower
+        stats[f"p{p:g}"] = values[lower] * (1 - fraction) + values[upper] * fraction
+    return stats
+
+
+def aggregate(chunks, width, percentiles=(50, 95), min_valid=MIN_VALID):
+    """Агрегация по окнам фиксированной ширины в постоянной памяти
+
+    Ожидается, что отсчеты идут по времени (файлы в хронологическом
+    порядке). Последнее окно пачки может продолжиться в следующей, поэтому
+    его значения переносятся, остальные окна выдаются сразу.
+    """
+    carry_keys = np.empty(0, dtype=np.int64)
+    carry_values = np.empty(0)
+    for stamps, values in chunks:
+        valid = values > min_valid
+        keys = np.concatenate((carry_keys, stamps[valid] // width))
+        values = np.concatenate((carry_values, values[valid]))
+        if not len(keys):
+            continue
+        tail = keys == keys[-1]
+        carry_keys, carry_values = keys[tail], values[tail]
+        keys, values = keys[~tail], values[~tail]
+        if len(keys):
+            order = np.lexsort((values, keys))
+            yield window_stats(keys[order], values[order], percentiles)
+    if len(carry_keys):
+        order = np.argsort(carry_values, kind="stable")
+        yield window_stats(carry_keys, carry_values[order], percentiles)
+
+
+def parse_window(text):
+    if text in WINDOWS:
+        return WINDOWS[text]
+    if text.endswith("s"):
+        text = text[:-1]
+    return int(text)
+
+
+def write_csv(stats_iter, width, percentiles, out):
+    columns = ["count", "min", "max", "mean"] + [f"p{p:g}" for p in percentiles]
+    out.write("window_start," + ",".join(columns) + "\n")
+    for stats in stats_iter:
+        starts = (stats["window"] * width).astype("datetime64[s]").astype(str)
+        rows = zip(starts, *(stats[column] for column in columns))
+        for start, count, *numbers in rows:
+            out.write(f"{start.replace('T', ' ')},{count}," + ",".join(f"{n:.2f}" for n in numbers) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статистика температуры по окнам времени из логов")
+    parser.add_argument("logs", nargs="+", help="файлы или маски *_temperature_log.txt[.gz|.zst]")
+    parser.add_argument("--window", default="minute", help="minute, hour, day или число секунд")
+    parser.add_argument("-p", "--percentile", type=float, action="append",
+                        help="перцентиль (можно несколько раз), по умолчанию 50 и 95")
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    parser.add_argument("--encoding", default="cp1251")
+    parser.add_argument("--fill", type=int, metavar="INTERVAL",
+                        help="восстановить ряд с этим шагом (с) для логов только изменений")
+    parser.add_argument("--max-gap", type=int, help="не заполнять промежутки длиннее, с")
+    args = parser.parse_args()
+
+    paths = []
+    for pattern in args.logs:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    width = parse_window(args.window)
+    percentiles = args.percentile or [50, 95]
+
+    chunks = iter_chunks(iter_samples(paths, args.encoding), args.chunk_size)
+    if args.fill:
+        chunks = fill_chunks(chunks, args.fill, args.max_gap)
+    write_csv(aggregate(chunks, width, percentiles), width, percentiles, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import datetime
+import gzip
+import io
+import os
+import queue
+import shutil
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def open_log(path, encoding=None):
+    """Открытие лога на чтение как текста, в том числе сжатых сегментов .gz и .zst"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding=encoding, errors="replace")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"Для чтения {path} нужен пакет zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(raw, encoding=encoding, errors="replace")
+    return open(path, encoding=encoding, errors="replace")
+
+
+def console_line(message):
+    """Строка консольного лога с отметкой времени: '[11:46:19] сообщение'"""
+    return f"[{time.strftime('%H:%M:%S', time.localtime())}] {message}"
+
+
+class LogWriter:
+    """Фоновая запись лога пачками с ротацией и сжатием закрытых файлов
+
+    Строки копятся в очереди и пишутся одним вызовом не чаще чем раз в
+    flush_interval секунд или при накоплении batch_bytes. Поэтому при сбое
+    теряется не больше flush_interval секунд лога. Файл сменяется при
+    превышении max_bytes или при смене суток, закрытые файлы сжимаются
+    gzip (или zstd, если установлен пакет zstandard).
+
+    Ошибка записи не останавливает лог: незаписанные строки придерживаются
+    (не больше max_pending_bytes, самые старые отбрасываются), а запись
+    повторяется в тот же файл, открытый заново, с паузой от flush_interval
+    до max_retry_delay, удваивающейся после каждой неудачи. on_error
+    вызывается на первой ошибке серии, а не на каждой пачке.
+    """
+
+    def __init__(self, suffix, directory=".", flush_interval=1.0, batch_bytes=64 * 1024,
+                 max_bytes=50 * 1024 * 1024, rotate_daily=True, compression="gzip",
+                 encoding=None, on_error=None, max_pending_bytes=4 * 1024 * 1024,
+                 max_retry_delay=60.0):
+        self.suffix = suffix
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_bytes = batch_bytes
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        if compression == "zstd" and zstandard is None:
+            compression = "gzip"
+        self.compression = compression
+        self.encoding = encoding
+        self.on_error = on_error
+        self.max_pending_bytes = max_pending_bytes
+        self.max_retry_delay = max_retry_delay
+
+        self.lines = queue.SimpleQueue()
+        self.file = None
+        self.filename = None
+        self.used_names = set()
+        self.size = 0
+        self.day = None
+        self.error = None
+        # Строки, не записанные из-за ошибки, и число отброшенных строк
+        self.unwritten = []
+        self.dropped = 0
+        self.retry_delay = flush_interval
+        self.retry_at = 0.0
+        self.active = True
+        self.compressors = []
+        self.open_segment()
+        self.thread = threading.Thread(target=self.run, name=f"log-writer-{suffix}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, line):
+        """Постановка строки в очередь записи (из любого потока)"""
+        self.lines.put(line)
+
+    def open_segment(self):
+        now = datetime.datetime.now()
+        base = os.path.join(self.directory, f"{now.strftime('%Y%m%d_%H%M%S')}_{self.suffix}")
+        self.filename = base + ".txt"
+        # При ротации чаще раза в секунду имя дополняется номером сегмента
+        number = 1
+        while self.filename in self.used_names or any(
+                os.path.exists(self.filename + ext) for ext in (".gz", ".zst")):
+            self.filename = f"{base}.{number}.txt"
+            number += 1
+        self.used_names.add(self.filename)
+        self.file = open(self.filename, "a", encoding=self.encoding)
+        self.size = self.file.tell()
+        self.day = now.date()
+
+    def rotate(self):
+        closed = self.filename
+        self.file.close()
+        self.open_segment()
+        if self.compression:
+            compressor = threading.Thread(target=self.compress, args=(closed,))
+            compressor.daemon = True
+            compressor.start()
+            self.compressors.append(compressor)
+
+    def compress(self, path):
+        try:
+            if self.compression == "zstd":
+                with open(path, "rb") as src, open(path + ".zst", "wb") as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except Exception as e:
+            # Несжатый сегмент остается на диске, запись лога продолжается
+            if self.on_error:
+                self.on_error(e)
+
+    def report(self, error):
+        first = self.error is None
+        if first:
+            self.retry_delay = self.flush_interval
+        else:
+            self.retry_delay = min(self.max_retry_delay, self.retry_delay * 2)
+        self.retry_at = time.monotonic() + self.retry_delay
+        self.error = error
+        if first and self.on_error:
+            self.on_error(error)
+
+    def hold(self, batch):
+        """Сохранение незаписанной пачки для повтора в пределах max_pending_bytes"""
+        self.unwritten = batch
+        size = sum(len(line) + 1 for line in batch)
+        drop = 0
+        while size > self.max_pending_bytes and drop < len(batch):
+            size -= len(batch[drop]) + 1
+            drop += 1
+        if drop:
+            self.dropped += drop
+            del self.unwritten[:drop]
+
+    def write_batch(self, batch):
+        if self.error is not None:
+            # В буфере файла могла остаться часть пачки; файл открывается
+            # заново, чтобы повтор не записал ее дважды
+            try:
+                self.file.close()
+            except Exception:
+                pass
+            self.file = open(self.filename, "a", encoding=self.encoding)
+            self.size = self.file.tell()
+        elif self.size >= self.max_bytes or (
+                self.rotate_daily and datetime.date.today() != self.day):
+            self.rotate()
+        data = "\n".join(batch) + "\n"
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+        self.error = None
+
+    def collect(self, deadline):
+        """Сбор пачки строк до дедлайна или заполнения пачки"""
+        batch = []
+        size = 0
+        while size < self.batch_bytes:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0:
+                    line = self.lines.get_nowait()
+                else:
+                    line = self.lines.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if line is None:
+                self.active = False
+                break
+            batch.append(line)
+            size += len(line) + 1
+        return batch
+
+    def run(self):
+        while self.active or not self.lines.empty():
+            batch = self.collect(time.monotonic() + self.flush_interval)
+            if self.unwritten:
+                batch = self.unwritten + batch
+                self.unwritten = []
+            if not batch:
+                continue
+            if self.error is not None and self.active and time.monotonic() < self.retry_at:
+                self.hold(batch)
+                continue
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.hold(batch)
+                self.report(e)
+                if not self.active:
+                    # Закрытие: повторять больше некогда
+                    break
+        try:
+            self.file.close()
+        except Exception as e:
+            self.report(e)
+
+    def close(self, timeout=5.0):
+        """Запись оставшихся строк и закрытие файла"""
+        self.lines.put(None)
+        self.thread.join(timeout)
+        for compressor in self.compressors:
+            compressor.join(timeout)
@@ -1,80 +1,259 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import telnetlib
+import collections
+import concurrent.futures
+import glob
+import os
+import queue
 import threading
 import time
-import datetime
 
+from adaptive import AdaptivePolicy
+from chart import Downsampler, RingBuffer
+from device import TelnetClient
+from log_writer import LogWriter, console_line
+from metrics import metrics
+from monitor import Monitor
+from recording import ChangeRecorder
+from responses import SENSOR_ERROR, format_temperature, parse_temperature, parse_thresholds
+from sample_store import SampleStore, read_text_log
+from scheduler import default_scheduler
+from session import SessionManager
+
+
+class CommandExecutor:
+    """Выполнение команд устройства вне потока Tk
+
+    submit возвращает Future, а callback с результатом вызывается уже в
+    потоке Tk: готовые результаты забираются из очереди по таймеру after().
+    Один рабочий поток сохраняет порядок команд, отправленных из интерфейса.
+    Исключение задачи передается в on_error (тоже в потоке Tk).
+    """
+
+    def __init__(self, root, max_workers=1, poll_ms=50, on_error=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_error = on_error
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="device"
+        )
+        self.ready = queue.SimpleQueue()
+        self.root.after(self.poll_ms, self.dispatch)
 
-class TelnetClient:
-    def __init__(self):
-        self.tn = None
-        self.connected = False
-        self.lock = threading.Lock()
+    def submit(self, func, *args, callback=None):
+        future = self.pool.submit(func, *args)
+        if callback is not None:
+            future.add_done_callback(lambda f: self.ready.put((callback, f)))
+        return future
 
-    def connect(self, host, port):
-        try:
-            self.tn = telnetlib.Telnet(host, port, timeout=5)
-            # Читаем приветственное сообщение полностью
-            welcome = self.read_full_welcome()
-            self.connected = True
-            return welcome
-        except Exception as e:
-            self.connected = False
-            return str(e)
+    def post(self, func, *args):
+        """Вызов функции в потоке Tk из любого потока"""
+        self.ready.put((func, args))
 
-    def read_full_welcome(self):
-        """Чтение всего приветственного сообщения до промпта '>'"""
-        full_message = ""
-        while True:
-            try:
-                part = self.tn.read_until(b'\n', timeout=0.5).decode('ascii')
-                if not part:
-                    break
-                full_message += part
-                if full_message.endswith('>'):
-                    break
-            except (EOFError, ConnectionResetError):
-                break
-        return full_message.strip()
-
-    def disconnect(self):
-        if self.connected:
-            self.tn.close()
-            self.connected = False
+    def dispatch(self):
+        # Перепланирование в finally: ошибка в callback не останавливает очередь
+        try:
+            while True:
+                func, payload = self.ready.get_nowait()
+                if isinstance(payload, concurrent.futures.Future):
+                    if payload.cancelled():
+                        continue
+                    error = payload.exception()
+                    if error is not None:
+                        if self.on_error:
+                            self.on_error(error)
+                        continue
+                    func(payload.result())
+                else:
+                    func(*payload)
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(self.poll_ms, self.dispatch)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TemperatureChart:
+    """Живой график температуры на Canvas
+
+    Отсчеты хранятся в кольцевом буфере фиксированного размера, на экран
+    выводится не больше точки на пиксель (LTTB с кэшем готовых корзин).
+    Перерисовка идет по таймеру не чаще redraw_ms и только при новых
+    данных; линия обновляется через coords без пересоздания элементов.
+    """
+
+    SPANS = {
+        "10 мин": 600,
+        "1 ч": 3600,
+        "6 ч": 6 * 3600,
+        "1 сут": 86400,
+        "7 сут": 7 * 86400,
+        "Вся история": None,
+    }
+    MARGIN = 40
+
+    def __init__(self, parent, capacity=100000, redraw_ms=500):
+        self.capacity = capacity
+        self.redraw_ms = redraw_ms
+        self.buffer = RingBuffer(capacity)
+        self.downsampler = Downsampler()
+        self.span = self.SPANS["1 ч"]
+        self.dirty = False
+        self.pending = None
+        self.last_cost = 0.0
+
+        self.frame = ttk.Frame(parent)
+        self.toolbar = ttk.Frame(self.frame)
+        self.toolbar.pack(fill=tk.X)
+        ttk.Label(self.toolbar, text="Период:").pack(side=tk.LEFT, padx=5, pady=2)
+        self.span_box = ttk.Combobox(self.toolbar, values=list(self.SPANS), width=12, state="readonly")
+        self.span_box.set("1 ч")
+        self.span_box.bind("<<ComboboxSelected>>", self.on_span)
+        self.span_box.pack(side=tk.LEFT, padx=5, pady=2)
+
+        self.canvas = tk.Canvas(self.frame, height=160, background="white", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=2)
+        self.line = self.canvas.create_line(0, 0, 0, 0, fill="#1f77b4", width=1.5)
+        self.line_visible = False
+        self.canvas.itemconfig(self.line, state=tk.HIDDEN)
+        self.top_label = self.canvas.create_text(2, 2, anchor=tk.NW, font="TkSmallCaptionFont")
+        self.bottom_label = self.canvas.create_text(2, 0, anchor=tk.SW, font="TkSmallCaptionFont")
+        self.start_label = self.canvas.create_text(self.MARGIN, 0, anchor=tk.SW, font="TkSmallCaptionFont")
+        self.end_label = self.canvas.create_text(0, 0, anchor=tk.SE, font="TkSmallCaptionFont")
+        self.canvas.bind("<Configure>", lambda event: self.request_redraw())
+
+    def pixels(self):
+        return max(1, self.canvas.winfo_width() - self.MARGIN - 5)
+
+    def on_span(self, event=None):
+        self.span = self.SPANS[self.span_box.get()]
+        self.request_redraw()
+
+    def add(self, timestamp, value):
+        self.buffer.append(timestamp, value)
+        self.request_redraw()
+
+    def replace(self, buffer, downsampler):
+        """Подмена буфера загруженной историей (в потоке Tk)
+
+        Отсчеты, полученные за время загрузки, дописываются в новый буфер.
+        """
+        last = buffer.time(len(buffer) - 1) if len(buffer) else float("-inf")
+        for index in range(self.buffer.bisect(last + 1e-9), len(self.buffer)):
+            buffer.append(*self.buffer.point(index))
+        self.buffer = buffer
+        self.downsampler = downsampler
+        self.request_redraw()
+
+    def request_redraw(self):
+        """Отложенная перерисовка; интервал растет, если отрисовка дорогая"""
+        self.dirty = True
+        if self.pending is None:
+            delay = max(self.redraw_ms, int(self.last_cost * 4000))
+            self.pending = self.canvas.after(delay, self.redraw)
+
+    def redraw(self):
+        self.pending = None
+        if not self.dirty:
+            return
+        self.dirty = False
+        started = time.perf_counter()
+
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        points = []
+        if len(self.buffer) and width > self.MARGIN + 10:
+            end = self.buffer.time(len(self.buffer) - 1)
+            start = self.buffer.time(0) if self.span is None else end - self.span
+            points = self.downsampler.points(self.buffer, start, end, self.pixels())
+
+        if not points:
+            if self.line_visible:
+                self.canvas.itemconfig(self.line, state=tk.HIDDEN)
+                self.line_visible = False
+            return
 
-    def send_command(self, command):
-        with self.lock:
-            if not self.connected:
-                return "Не подключено"
-            try:
-                self.tn.write(command.encode('ascii') + b'\r\n')
-                # Читаем ответ до промпта '>'
-                response = self.tn.read_until(b'>', timeout=5).decode('ascii').strip()
-                # Убираем последний символ '>' если он есть
-                if response.endswith('>'):
-                    response = response[:-1].strip()
-                return response
-            except Exception as e:
-                self.connected = False
-                return f"Ошибка: {str(e)}"
+        low = min(v for _, v in points)
+        high = max(v for _, v in points)
+        if high - low < 1:
+            low, high = low - 0.5, high + 0.5
+        first = points[0][0]
+        duration = max(points[-1][0] - first, 1e-9)
+        plot_width = self.pixels()
+        plot_height = max(1, height - 30)
+        coords = []
+        for t, v in points:
+            coords.append(self.MARGIN + (t - first) / duration * plot_width)
+            coords.append(15 + (high - v) / (high - low) * plot_height)
+        if len(coords) == 2:
+            coords += coords
+        self.canvas.coords(self.line, *coords)
+        if not self.line_visible:
+            self.canvas.itemconfig(self.line, state=tk.NORMAL)
+            self.line_visible = True
+
+        time_format = "%H:%M:%S" if duration < 86400 else "%d.%m %H:%M"
+        self.canvas.itemconfig(self.top_label, text=f"{high:.1f}")
+        self.canvas.coords(self.bottom_label, 2, height - 12)
+        self.canvas.itemconfig(self.bottom_label, text=f"{low:.1f}")
+        self.canvas.coords(self.start_label, self.MARGIN, height)
+        self.canvas.itemconfig(self.start_label, text=time.strftime(time_format, time.localtime(first)))
+        self.canvas.coords(self.end_label, width - 5, height)
+        self.canvas.itemconfig(
+            self.end_label,
+            text=time.strftime(time_format, time.localtime(points[-1][0]))
+        )
+        self.last_cost = time.perf_counter() - started
 
 
 class App:
     def __init__(self, root):
         self.root = root
         self.root.title("Little Correlation GUI")
-        self.root.geometry("800x700")
-
+        self.root.geometry("800x860")
+
+        # Сообщения из любых потоков копятся в очереди и выводятся пачками
+        self.log_queue = queue.SimpleQueue()
+        self.console_max_lines = 5000
+        self.console_flush_ms = 100
+        self.stats_refresh_ms = 2000
+        # В GUI одно устройство, стоимость замеров несущественна
+        metrics.enabled = True
+
+        self.executor = CommandExecutor(
+            root,
+            on_error=lambda e: self.log(f"Ошибка выполнения команды: {str(e) or type(e).__name__}")
+        )
         self.telnet = TelnetClient()
+        self.session = SessionManager(
+            self.telnet,
+            on_event=self.log,
+            on_state=lambda state: self.executor.post(self.update_connection_status)
+        )
         self.logging = False
-        self.log_file = None
+        self.log_writer = None
         self.monitoring_active = False
-        self.monitoring_thread = None
-        self.keepalive_active = False
-        self.keepalive_thread = None
+        self.monitor = None
         self.polling_interval = 10  # seconds
+        self.threshold_refresh_interval = 60  # seconds
+        self.threshold_job = None
+        self.sample_store = None
+        self.sample_store_path = "temperature"
+        # Запись только изменений: порог изменения и контрольная точка, с
+        self.record_deadband = 0.0
+        self.record_heartbeat = 300
+        # Границы интервала адаптивного опроса, с
+        self.adaptive_floor = 5
+        self.adaptive_ceiling = 120
         self.fan_mode = "auto"  # auto/manual
+        # Сколько дней истории загружать в график
+        self.history_days = 7
+        # Устройство последнего мониторинга: история в хранилище общая для
+        # всех устройств, в график загружаются отсчеты только этого
+        self.history_device = None
 
         # Создаем панели
         main_panel = tk.PanedWindow(root, orient=tk.VERTICAL, sashrelief=tk.RAISED, sashwidth=4)
@@ -84,6 +263,18 @@ class App:
         control_frame = ttk.Frame(main_panel)
         main_panel.add(control_frame)
 
+        # Средняя панель (график температуры)
+        chart_frame = ttk.LabelFrame(main_panel, text="График температуры")
+        main_panel.add(chart_frame)
+        self.chart = TemperatureChart(chart_frame)
+        self.chart.frame.pack(fill=tk.BOTH, expand=True)
+        self.history_button = ttk.Button(
+            self.chart.toolbar,
+            text="Загрузить историю",
+            command=self.load_history
+        )
+        self.history_button.pack(side=tk.LEFT, padx=5, pady=2)
+
         # Нижняя панель (консоль)
         console_frame = ttk.Frame(main_panel)
         main_panel.add(console_frame)
@@ -103,23 +294,50 @@ class App:
         # Обработка закрытия окна
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        self.root.after(self.console_flush_ms, self.flush_console)
+        self.root.after(self.stats_refresh_ms, self.update_stats)
+
     def log(self, message):
         """Логирование в консоль и файл"""
-        timestamp = time.strftime("%H:%M:%S", time.localtime())
-        log_message = f"[{timestamp}] {message}"
+        log_message = console_line(message)
 
-        self.console.config(state=tk.NORMAL)
-        self.console.insert(tk.END, log_message + "\n")
-        self.console.config(state=tk.DISABLED)
-        self.console.see(tk.END)
+        # Консоль обновляется только в потоке Tk, см. flush_console
+        self.log_queue.put(log_message)
 
-        if self.logging and self.log_file:
-            try:
-                self.log_file.write(log_message + "\n")
-                self.log_file.flush()
-            except Exception as e:
-                self.log(f"Ошибка записи в лог: {str(e)}")
-                self.logging = False
+        if self.logging and self.log_writer:
+            # Запись в файл выполняется пачками в потоке LogWriter
+            self.log_writer.write(log_message)
+
+    def on_log_error(self, error):
+        """Ошибка записи лога (вызывается из потока LogWriter)
+
+        Запись не отключается: LogWriter сохраняет строки и повторяет их.
+        """
+        self.log(f"Ошибка записи в лог: {str(error)}")
+
+    def flush_console(self):
+        """Вывод накопленных сообщений в консоль одной вставкой
+
+        Консоль хранит только последние console_max_lines строк, поэтому
+        память и стоимость перерисовки не растут при долгой работе.
+        """
+        lines = []
+        try:
+            while len(lines) < self.console_max_lines:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if lines:
+            self.console.config(state=tk.NORMAL)
+            self.console.insert(tk.END, "\n".join(lines) + "\n")
+            line_count = int(self.console.index("end-1c").split(".")[0]) - 1
+            if line_count > self.console_max_lines:
+                self.console.delete("1.0", f"{line_count - self.console_max_lines + 1}.0")
+            self.console.config(state=tk.DISABLED)
+            self.console.see(tk.END)
+
+        self.root.after(self.console_flush_ms, self.flush_console)
 
     def init_control_tab(self, tab):
         """Инициализация панели управления"""
@@ -171,13 +389,13 @@ class App:
         ttk.Button(
             relay_frame,
             text="Включить сигнал",
-            command=lambda: self.send_command("1")
+            command=lambda: self.request("1")
         ).pack(side=tk.LEFT, padx=5, pady=5)
 
         ttk.Button(
             relay_frame,
             text="Выключить сигнал",
-            command=lambda: self.send_command("2")
+            command=lambda: self.request("2")
         ).pack(side=tk.LEFT, padx=5, pady=5)
 
         # Температура и мониторинг
@@ -191,7 +409,7 @@ class App:
         ttk.Button(
             temp_row1,
             text="Показать температуру",
-            command=lambda: self.send_command("3")
+            command=lambda: self.request("3")
         ).pack(side=tk.LEFT, padx=5, pady=2)
 
         self.temp_label = ttk.Label(temp_row1, text="---")
@@ -213,6 +431,20 @@ class App:
         )
         self.monitor_button.pack(side=tk.LEFT, padx=5, pady=2)
 
+        self.changes_only = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            temp_row2,
+            text="Писать только изменения",
+            variable=self.changes_only
+        ).pack(side=tk.LEFT, padx=5, pady=2)
+
+        self.adaptive_polling = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            temp_row2,
+            text="Адаптивный интервал",
+            variable=self.adaptive_polling
+        ).pack(side=tk.LEFT, padx=5, pady=2)
+
         # Управление вентилятором - строка 1: Автоматический режим и пороги
         fan_frame1 = ttk.LabelFrame(tab, text="Управление вентилятором (автоматический режим)")
         fan_frame1.pack(fill=tk.X, padx=5, pady=5)
@@ -275,7 +507,7 @@ class App:
         self.fan_on_button = ttk.Button(
             control_frame,
             text="Включить вентилятор",
-            command=lambda: self.send_command("6"),
+            command=lambda: self.request("6"),
             state=tk.DISABLED
         )
         self.fan_on_button.pack(side=tk.LEFT, padx=5, pady=2)
@@ -283,16 +515,46 @@ class App:
         self.fan_off_button = ttk.Button(
             control_frame,
             text="Выключить вентилятор",
-            command=lambda: self.send_command("7"),
+            command=lambda: self.request("7"),
             state=tk.DISABLED
         )
         self.fan_off_button.pack(side=tk.LEFT, padx=5, pady=2)
 
-
+        # Статистика команд
+        stats_frame = ttk.LabelFrame(tab, text="Статистика команд")
+        stats_frame.pack(fill=tk.X, padx=5, pady=5)
+
+        self.stats_label = ttk.Label(stats_frame, text="---", justify=tk.LEFT, font="TkFixedFont")
+        self.stats_label.pack(side=tk.LEFT, padx=5, pady=2)
+
+    def update_stats(self):
+        """Обновление панели статистики по метрикам команд"""
+        summary = metrics.summary()
+
+        def ms(value):
+            if value is None:
+                return "-"
+            return ">5000" if value == float("inf") else f"{value * 1000:g}"
+
+        lines = [
+            f"{row['command']:>3}: {row['count']} шт, p50 <= {ms(row['p50'])} мс, "
+            f"p95 <= {ms(row['p95'])} мс, таймауты {row['timeouts']}, ошибки {row['errors']}"
+            for row in summary["commands"]
+        ]
+        lines.append(
+            f"Переподключений: {summary['reconnects']}, ошибок подключения: {summary['connect_errors']}, "
+            f"в очереди: {summary['inflight']}, ожидание блокировки p95 <= {ms(summary['lock_wait_p95'])} мс"
+        )
+        lines.append(
+            f"Подключение p95 <= {ms(summary['connect_p95'])} мс "
+            f"(TCP {ms(summary['connect_tcp_p95'])}, приветствие {ms(summary['connect_welcome_p95'])})"
+        )
+        self.stats_label.config(text="\n".join(lines))
+        self.root.after(self.stats_refresh_ms, self.update_stats)
 
     def update_connection_status(self):
         """Обновление состояния кнопок в зависимости от подключения"""
-        connected = self.telnet.connected
+        connected = self.session.connected
 
         # Обновляем состояние кнопок ручного управления
         if connected and self.fan_mode == "manual":
@@ -304,44 +566,6 @@ class App:
 
         # Можно добавить обновление других элементов интерфейса здесь
 
-    def start_keepalive(self):
-        """Запуск периодической отправки команды 11 для поддержания соединения"""
-        if self.keepalive_active:
-            return
-
-        self.keepalive_active = True
-        self.keepalive_thread = threading.Thread(target=self.keepalive_loop)
-        self.keepalive_thread.daemon = True
-        self.keepalive_thread.start()
-
-    def stop_keepalive(self):
-        """Остановка периодической отправки команды 11"""
-        self.keepalive_active = False
-        if self.keepalive_thread and self.keepalive_thread.is_alive():
-            self.keepalive_thread.join(timeout=1.0)
-
-    def keepalive_loop(self):
-        """Цикл периодической отправки команды 11"""
-        while self.keepalive_active and self.telnet.connected:
-            try:
-                # Отправляем команду 11 для поддержания соединения
-                response = self.send_command("11")
-
-                # Если команда не удалась, считаем соединение разорванным
-                if "Ошибка" in response or "Не подключено" in response:
-                    self.telnet.connected = False
-                    self.log("Соединение прервано")
-                    self.update_connection_status()
-                    break
-
-                # Ждем 28 секунд до следующей отправки
-                time.sleep(28)
-            except Exception as e:
-                self.telnet.connected = False
-                self.log(f"Ошибка в keepalive: {str(e)}")
-                self.update_connection_status()
-                break
-
     def connect_device(self):
         """Подключение к устройству"""
         ip = self.ip_entry.get()
@@ -357,64 +581,171 @@ class App:
             self.log("Ошибка: Некорректный порт")
             return
 
-        result = self.telnet.connect(ip, port)
+        # Сессия сама переподключается и поддерживает канал командой 11
+        self.log(f"Подключение к {ip}:{port}...")
+        self.executor.submit(
+            self.session.start, ip, port,
+            callback=lambda result: self.on_connected(ip, port, result)
+        )
+
+    def on_connected(self, ip, port, result):
+        """Результат подключения (в потоке Tk)"""
         if self.telnet.connected:
-            self.log(f"Успешно подключено к {ip}:{port}")
+            self.log(f"Успешно подключено к {ip}:{port} за {self.telnet.last_connect_time:.3f} с")
             self.log(f"Сообщение сервера:\n{result}")
-            # Запускаем keepalive
-            self.start_keepalive()
-            # Обновляем состояние интерфейса
-            self.update_connection_status()
         else:
             self.log(f"Ошибка подключения: {result}")
-            self.update_connection_status()
+        # Обновляем состояние интерфейса
+        self.update_connection_status()
+
+        # Пороги периодически перечитываются общим планировщиком
+        if self.threshold_job is None:
+            self.threshold_job = default_scheduler.every(
+                self.threshold_refresh_interval,
+                self.refresh_thresholds,
+                name="thresholds",
+                delay=0
+            )
+
+    def refresh_thresholds(self):
+        """Фоновое чтение порогов без вывода в консоль"""
+        if self.session.connected:
+            response = self.session.send_command("9")
+            self.executor.post(self.apply_response, "9", response)
 
     def send_command_10(self):
         """Отправка команды на устройство"""
         ip = self.ip_entry_1.get()
         port = self.port_entry_1.get()
 
-        if not self.telnet.connected:
+        if not self.session.connected:
             self.log("Не подключено к устройству")
             return
 
         command = '10 ' + ip + ' ' + port
-
-        self.log(f"Отправка команды: {command}")
-        response = self.telnet.send_command(command)
-        self.log(f"Ответ: {response}")
-
-        return response
+        return self.request(command)
 
     def send_command(self, command):
         """Отправка команды на устройство"""
-        if not self.telnet.connected:
-            self.log("Не подключено к устройству")
-            self.update_connection_status()
-            return "Не подключено"
+        if not self.session.connected:
+            response = self.session.defer(command)
+            self.log(f"{response}: {command}")
+            return response
 
         self.log(f"Отправка команды: {command}")
-        response = self.telnet.send_command(command)
+        response = self.session.send_command(command)
         self.log(f"Ответ: {response}")
 
-        # Проверяем, не разорвано ли соединение
-        if "Ошибка" in response or not self.telnet.connected:
-            self.update_connection_status()
+        # Виджеты обновляются в потоке Tk
+        self.executor.post(self.apply_response, command, response)
 
-        # Обработка ответов для обновления интерфейса
+        return response
+
+    def request(self, command, callback=None):
+        """Асинхронная отправка команды, возвращает Future с ответом"""
+        return self.executor.submit(self.send_command, command, callback=callback)
+
+    def apply_response(self, command, response):
+        """Обработка ответов для обновления интерфейса"""
         if command == "3":  # Температура
-            self.temp_label.config(text=response)
+            value = parse_temperature(response)
+            self.temp_label.config(text=response if value is None else format_temperature(value))
+            if value is not None and value != SENSOR_ERROR:
+                self.chart.add(time.time(), value)
         elif command == "9":  # Пороги температуры
-            self.threshold_label.config(text=f"Текущие пороги: {response}")
+            thresholds = parse_thresholds(response)
+            if thresholds:
+                self.threshold_label.config(
+                    text=f"Текущие пороги: Low {thresholds.low:g}, High {thresholds.high:g}"
+                )
+                if self.monitoring_active and self.monitor.adaptive:
+                    self.monitor.adaptive.set_thresholds(self.monitor.device, thresholds)
+            elif self.session.connected:
+                self.threshold_label.config(text=f"Текущие пороги: {response}")
         elif command == "10":  # Смена IP и шлюза
             self.threshold_label.config(text=f"Текущие пороги: {response}")
 
-        return response
+    def load_history(self):
+        """Загрузка истории в график в фоновом потоке"""
+        self.history_button.config(state=tk.DISABLED)
+        device = self.history_device
+        if device is None and self.session.host is not None:
+            device = f"{self.session.host}:{self.session.port}"
+        thread = threading.Thread(
+            target=self.read_history,
+            args=(device, self.chart.span, self.chart.pixels()),
+            name="history"
+        )
+        thread.daemon = True
+        thread.start()
+
+    def read_history(self, device, span, pixels):
+        """Чтение истории из хранилища отсчетов или текстовых логов (вне потока Tk)
+
+        Буфер и кэш прореживания готовятся здесь же, в поток Tk передается
+        только готовый результат.
+        """
+        start = time.time() - self.history_days * 86400
+        # Буфер все равно хранит только последние capacity отсчетов
+        points = collections.deque(maxlen=self.chart.capacity)
+        try:
+            if os.path.exists(self.sample_store_path + ".samples"):
+                if device is None:
+                    # Без устройства отсчеты всех устройств слились бы в одну линию
+                    self.log("История не загружена: не выбрано устройство")
+                    self.executor.post(lambda: self.history_button.config(state=tk.NORMAL))
+                    return
+                store = self.sample_store or SampleStore(self.sample_store_path)
+                try:
+                    points.extend((t, v) for t, _, v in store.query(start, device=device) if v != SENSOR_ERROR)
+                finally:
+                    if store is not self.sample_store:
+                        store.close()
+            else:
+                for path in sorted(glob.glob("*_temperature_log*.txt*")):
+                    if not path.endswith(".txt") and os.path.exists(path.rsplit(".", 1)[0]):
+                        # Сегмент еще сжимается, читается исходный файл
+                        continue
+                    points.extend(
+                        (t, v) for t, v in read_text_log(path) if t >= start and v != SENSOR_ERROR
+                    )
+        except Exception as e:
+            self.log(f"Ошибка загрузки истории: {str(e)}")
+            self.executor.post(lambda: self.history_button.config(state=tk.NORMAL))
+            return
+
+        buffer = RingBuffer(self.chart.capacity)
+        buffer.extend(sorted(points))
+        downsampler = Downsampler()
+        if len(buffer):
+            end = buffer.time(len(buffer) - 1)
+            downsampler.points(buffer, buffer.time(0) if span is None else end - span, end, pixels)
+        self.log(f"Загружено отсчетов истории: {len(buffer)}")
+        self.executor.post(self.show_history, buffer, downsampler)
+
+    def show_history(self, buffer, downsampler):
+        self.chart.replace(buffer, downsampler)
+        self.history_button.config(state=tk.NORMAL)
+
+    def send_commands(self, commands):
+        """Отправка пакета команд на устройство за один проход"""
+        if not self.session.connected:
+            responses = self.session.send_commands(commands)
+            for command, response in zip(commands, responses):
+                self.log(f"{response}: {command}")
+            return responses
+
+        self.log(f"Отправка команд: {'; '.join(commands)}")
+        responses = self.session.send_commands(commands)
+        for command, response in zip(commands, responses):
+            self.log(f"Ответ ({command}): {response}")
+
+        return responses
 
     def enable_auto_fan(self):
         """Включение автоматического режима вентилятора"""
         self.fan_mode = "auto"
-        self.send_command("4")
+        self.request("4")
         # Деактивируем кнопки ручного управления
         self.fan_on_button.config(state=tk.DISABLED)
         self.fan_off_button.config(state=tk.DISABLED)
@@ -423,17 +754,13 @@ class App:
     def enable_manual_fan(self):
         """Включение ручного режима вентилятора"""
         self.fan_mode = "manual"
-        self.send_command("5")
-        # Активируем кнопки ручного управления только если есть соединение
-        if self.telnet.connected:
-            self.fan_on_button.config(state=tk.NORMAL)
-            self.fan_off_button.config(state=tk.NORMAL)
+        # Кнопки ручного управления активируются после ответа устройства
+        self.request("5", callback=lambda response: self.update_connection_status())
         self.log("Включен ручной режим вентилятора")
 
     def get_thresholds(self):
-        """Установка порогов температуры"""
-        self.send_command("9")
-        # Автоматически обновляем отображение порогов
+        """Получение порогов температуры"""
+        # Одна команда 9, метка обновляется в apply_response
         self.update_thresholds()
 
     def set_thresholds(self):
@@ -446,17 +773,16 @@ class App:
             return
 
         command = f"8 {min_val} {max_val}"
-        self.send_command(command)
-
-        # Автоматически обновляем отображение порогов
-        self.update_thresholds()
+        # Установка и чтение порогов одним пакетом
+        self.executor.submit(
+            self.send_commands, [command, "9"],
+            callback=lambda responses: self.apply_response("9", responses[1])
+        )
 
     def update_thresholds(self):
         """Обновление отображения текущих порогов"""
-        if self.telnet.connected:
-            response = self.send_command("9")
-            response = response[17:]
-            self.threshold_label.config(text=f"Текущие пороги: {response}")
+        if self.session.connected:
+            self.request("9")
 
     def toggle_monitoring(self):
         """Переключение режима мониторинга температуры"""
@@ -464,80 +790,80 @@ class App:
             # Начать мониторинг
             try:
                 self.polling_interval = int(self.interval_entry.get())
-                if self.polling_interval <= 5 and self.polling_interval < 20:
-                    raise ValueError("Интервал должен быть больше 5 и меньше 20")
+                if not 5 <= self.polling_interval <= 20:
+                    raise ValueError("Интервал должен быть от 5 до 20 секунд")
             except ValueError as e:
                 self.log(f"Ошибка: {str(e)}")
                 return
 
             # Создаем файл лога
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.log_filename = f"{timestamp}_temperature_log.txt"
             try:
-                self.log_file = open(self.log_filename, 'a')
+                self.log_writer = LogWriter("temperature_log", on_error=self.on_log_error)
+                self.log_filename = self.log_writer.filename
                 self.logging = True
                 self.log(f"Начата запись температуры в {self.log_filename}")
             except Exception as e:
                 self.log(f"Ошибка создания файла лога: {str(e)}")
                 return
 
+            # Отсчеты дополнительно пишутся в двоичное хранилище
+            if self.sample_store is None:
+                try:
+                    self.sample_store = SampleStore(self.sample_store_path)
+                except Exception as e:
+                    self.log(f"Ошибка открытия хранилища отсчетов: {str(e)}")
+
+            recorder = None
+            if self.changes_only.get():
+                recorder = ChangeRecorder(self.record_deadband, self.record_heartbeat)
+            adaptive = None
+            if self.adaptive_polling.get():
+                adaptive = AdaptivePolicy(self.adaptive_floor, self.adaptive_ceiling)
+
             # Запускаем поток мониторинга
             self.monitoring_active = True
-            self.monitoring_thread = threading.Thread(target=self.monitor_temperature)
-            self.monitoring_thread.daemon = True
-            self.monitoring_thread.start()
+            self.monitor = Monitor(
+                self.session,
+                self.polling_interval,
+                log_writer=self.log_writer,
+                sample_store=self.sample_store,
+                send=self.send_command,
+                recorder=recorder,
+                adaptive=adaptive
+            )
+            self.monitor.start()
+            self.history_device = self.monitor.device
 
             self.monitor_button.config(text="Остановить мониторинг")
         else:
             # Остановить мониторинг
             self.monitoring_active = False
-            if self.logging and self.log_file:
-                try:
-                    self.log_file.close()
-                except Exception as e:
-                    self.log(f"Ошибка закрытия файла лога: {str(e)}")
+            self.monitor.stop()
+            if self.logging and self.log_writer:
                 self.logging = False
+                self.log_writer.close()
                 self.log("Мониторинг температуры остановлен")
+            if self.sample_store:
+                self.sample_store.flush()
 
             self.monitor_button.config(text="Начать мониторинг")
 
-    def monitor_temperature(self):
-        """Периодический опрос температуры"""
-        while self.monitoring_active:
-            start_time = time.time()
-
-            # Отправляем команду запроса температуры
-            response = self.send_command("3")
-
-            # Записываем в лог-файл
-            if self.logging and self.log_file:
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                try:
-                    self.log_file.write(f"{timestamp},{response}\n")
-                    self.log_file.flush()
-                except Exception as e:
-                    self.log(f"Ошибка записи температуры: {str(e)}")
-
-            # Ожидаем до следующего опроса
-            elapsed = time.time() - start_time
-            sleep_time = max(0.1, self.polling_interval - elapsed)
-            time.sleep(sleep_time)
-
     def on_closing(self):
         """Обработка закрытия приложения"""
         if self.monitoring_active:
             self.monitoring_active = False
-            if self.logging and self.log_file:
-                try:
-                    self.log_file.close()
-                except:
-                    pass
-
-        # Останавливаем keepalive
-        self.stop_keepalive()
-
-        if self.telnet.connected:
-            self.telnet.disconnect()
+            self.monitor.stop()
+            if self.logging and self.log_writer:
+                self.logging = False
+                self.log_writer.close()
+        if self.sample_store:
+            self.sample_store.close()
+
+        # Останавливаем сессию и keepalive
+        self.executor.shutdown()
+        if self.threshold_job:
+            self.threshold_job.cancel()
+        self.session.stop()
 
         self.root.destroy()
 
@@ -0,0 +1,178 @@
+import bisect
+import collections
+import http.server
+import threading
+
+
+# Границы корзин гистограмм задержки, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self, name, labels=""):
+        lines = []
+        cumulative = 0
+        prefix = labels + "," if labels else ""
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class Metrics:
+    """Счетчики и гистограммы команд устройства
+
+    Пока enabled ложно, вызывающий код пропускает замеры целиком, так что
+    стоимость выключенной инструментации - одна проверка атрибута.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.latency = collections.defaultdict(Histogram)
+        self.lock_wait = Histogram()
+        self.connect_time = Histogram()
+        # Фазы подключения: TCP и приветствие до промпта
+        self.connect_phase = {"tcp": Histogram(), "welcome": Histogram()}
+        self.counters = collections.Counter()
+        self.inflight = 0
+
+    def observe_command(self, code, seconds, outcome):
+        """Итог команды: outcome - ok, timeout или error"""
+        with self.lock:
+            self.latency[code].observe(seconds)
+            self.counters[("commands", code, outcome)] += 1
+
+    def observe_lock_wait(self, seconds):
+        with self.lock:
+            self.lock_wait.observe(seconds)
+
+    def observe_connect(self, tcp_time, welcome_time=None, ok=True, complete=True):
+        """Итог подключения; complete ложно, если приветствие не дождалось промпта"""
+        with self.lock:
+            if ok:
+                self.connect_phase["tcp"].observe(tcp_time)
+                self.connect_phase["welcome"].observe(welcome_time)
+                self.connect_time.observe(tcp_time + welcome_time)
+                if not complete:
+                    self.counters[("welcome_timeouts",)] += 1
+            self.counters[("connects", "ok" if ok else "error")] += 1
+
+    def inc(self, *key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def add_inflight(self, delta):
+        with self.lock:
+            self.inflight += delta
+
+    def render(self):
+        """Текст в формате Prometheus exposition"""
+        with self.lock:
+            lines = [
+                "# TYPE ltl_command_duration_seconds histogram",
+            ]
+            for code, histogram in sorted(self.latency.items()):
+                lines += histogram.render("ltl_command_duration_seconds", f'command="{code}"')
+            lines.append("# TYPE ltl_commands_total counter")
+            for key, value in sorted(self.counters.items()):
+                if key[0] == "commands":
+                    lines.append(f'ltl_commands_total{{command="{key[1]}",outcome="{key[2]}"}} {value}')
+            lines.append("# TYPE ltl_connects_total counter")
+            for key, value in sorted(self.counters.items()):
+                if key[0] == "connects":
+                    lines.append(f'ltl_connects_total{{result="{key[1]}"}} {value}')
+            lines.append("# TYPE ltl_reconnects_total counter")
+            lines.append(f"ltl_reconnects_total {self.counters[('reconnects',)]}")
+            lines.append("# TYPE ltl_connect_duration_seconds histogram")
+            lines += self.connect_time.render("ltl_connect_duration_seconds")
+            lines.append("# TYPE ltl_connect_phase_seconds histogram")
+            for phase, histogram in self.connect_phase.items():
+                lines += histogram.render("ltl_connect_phase_seconds", f'phase="{phase}"')
+            lines.append("# TYPE ltl_welcome_timeouts_total counter")
+            lines.append(f"ltl_welcome_timeouts_total {self.counters[('welcome_timeouts',)]}")
+            lines.append("# TYPE ltl_lock_wait_seconds histogram")
+            lines += self.lock_wait.render("ltl_lock_wait_seconds")
+            lines.append("# TYPE ltl_inflight_commands gauge")
+            lines.append(f"ltl_inflight_commands {self.inflight}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Краткая сводка по командам для панели статистики"""
+        with self.lock:
+            rows = []
+            for code, histogram in sorted(self.latency.items(), key=lambda item: int(item[0]) if item[0].isdigit() else 0):
+                rows.append({
+                    "command": code,
+                    "count": histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "timeouts": self.counters[("commands", code, "timeout")],
+                    "errors": self.counters[("commands", code, "error")],
+                })
+            return {
+                "commands": rows,
+                "reconnects": self.counters[("reconnects",)],
+                "connect_errors": self.counters[("connects", "error")],
+                "connect_p95": self.connect_time.quantile(0.95),
+                "connect_tcp_p95": self.connect_phase["tcp"].quantile(0.95),
+                "connect_welcome_p95": self.connect_phase["welcome"].quantile(0.95),
+                "inflight": self.inflight,
+                "lock_wait_p95": self.lock_wait.quantile(0.95),
+            }
+
+
+metrics = Metrics()
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=9105, host="127.0.0.1"):
+    """Включение метрик и запуск HTTP-эндпоинта /metrics в фоновом потоке"""
+    metrics.enabled = True
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http")
+    thread.daemon = True
+    thread.start()
+    return server
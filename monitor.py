@@ -0,0 +1,84 @@
+import datetime
+import time
+
+from responses import parse_temperature, parse_thresholds
+from scheduler import default_scheduler
+
+
+class Monitor:
+    """Периодический опрос температуры одного устройства без интерфейса
+
+    Команда 3 отправляется раз в interval секунд, строка '{время},{ответ}'
+    пишется в log_writer, числовое значение - в sample_store. С recorder
+    (ChangeRecorder) сохраняются только изменения значения, с adaptive
+    (AdaptivePolicy) интервал меняется после каждого опроса. Пока сессия
+    переподключается, опрос пропускается. Опрос выполняется общим
+    планировщиком, keepalive обеспечивает SessionManager.
+    """
+
+    def __init__(self, session, interval=10, log_writer=None, sample_store=None, send=None,
+                 scheduler=None, recorder=None, adaptive=None):
+        self.session = session
+        self.interval = interval
+        self.log_writer = log_writer
+        self.sample_store = sample_store
+        # Функция отправки команды; GUI подставляет свою, с выводом в консоль
+        self.send = send or session.send_command
+        self.scheduler = scheduler or default_scheduler
+        self.recorder = recorder
+        self.adaptive = adaptive
+        self.active = False
+        self.job = None
+
+    @property
+    def device(self):
+        return f"{self.session.host}:{self.session.port}"
+
+    def start(self):
+        self.active = True
+        self.job = self.scheduler.every(self.interval, self.tick, name=f"poll {self.device}", delay=0)
+
+    def stop(self):
+        self.active = False
+        if self.job:
+            self.job.cancel()
+        if self.recorder:
+            self.save(self.recorder.flush(self.device))
+
+    def poll(self):
+        """Один опрос температуры с записью результата"""
+        if self.adaptive and self.adaptive.thresholds_stale(self.device):
+            self.adaptive.set_thresholds(self.device, parse_thresholds(self.send("9")))
+
+        response = self.send("3")
+        timestamp = time.time()
+        value = parse_temperature(response)
+        record = (timestamp, value, response)
+        if self.recorder:
+            self.save(self.recorder.offer(self.device, timestamp, value, record))
+        else:
+            self.save([record])
+        if self.adaptive and self.job:
+            interval = self.adaptive.update(self.device, timestamp, value)
+            if interval != self.job.interval:
+                self.scheduler.set_interval(self.job, interval)
+        return response
+
+    def save(self, records):
+        for timestamp, value, response in records:
+            if self.log_writer:
+                moment = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                self.log_writer.write(f"{moment},{response}")
+            if self.sample_store and value is not None:
+                self.sample_store.append(timestamp, self.device, value)
+
+    def tick(self):
+        # Пока сессия переподключается, опрос пропускается
+        if self.active and self.session.connected:
+            self.poll()
+
+    def run(self):
+        """Опрос до вызова stop() в текущем потоке"""
+        self.start()
+        while self.active:
+            time.sleep(0.5)
@@ -0,0 +1,91 @@
+import threading
+
+
+class ChangeRecorder:
+    """Запись отсчетов только при изменении значения
+
+    Отсчет записывается, если значение отличается от последнего записанного
+    больше чем на deadband, или если с последней записи прошло heartbeat
+    секунд. Последний пропущенный отсчет серии придерживается и пишется
+    перед изменением, так что запись выглядит как пары (начало, конец)
+    каждого участка постоянного значения. Отсчеты без значения (ошибки)
+    пишутся всегда. Полный ряд восстанавливается функцией expand.
+    """
+
+    def __init__(self, deadband=0.0, heartbeat=300.0):
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.lock = threading.Lock()
+        # Ключ -> (время, значение) последней записи
+        self.last = {}
+        # Ключ -> придержанный отсчет, еще не записанный
+        self.held = {}
+        self.offered = 0
+        self.recorded = 0
+
+    def offer(self, key, timestamp, value, record=None):
+        """Новый отсчет; возвращает список записей, которые нужно сохранить
+
+        record - то, что нужно сохранить для отсчета (по умолчанию
+        (timestamp, value)); в списке придержанная запись идет первой.
+        """
+        if record is None:
+            record = (timestamp, value)
+        with self.lock:
+            self.offered += 1
+            last = self.last.get(key)
+            if value is not None and last is not None and last[1] is not None:
+                if abs(value - last[1]) <= self.deadband:
+                    if timestamp - last[0] < self.heartbeat:
+                        self.held[key] = record
+                        return []
+                    # Контрольная точка внутри участка заменяет придержанную
+                    self.held.pop(key, None)
+            records = []
+            held = self.held.pop(key, None)
+            if held is not None:
+                records.append(held)
+            records.append(record)
+            self.last[key] = (timestamp, value)
+            self.recorded += len(records)
+            return records
+
+    def flush(self, key=None):
+        """Придержанные записи (по одному ключу или по всем) для сохранения"""
+        with self.lock:
+            if key is None:
+                records = list(self.held.values())
+                self.held.clear()
+            else:
+                held = self.held.pop(key, None)
+                records = [] if held is None else [held]
+            self.recorded += len(records)
+            return records
+
+    def ratio(self):
+        """Доля записанных отсчетов от всех полученных"""
+        with self.lock:
+            return self.recorded / self.offered if self.offered else 1.0
+
+
+def expand(samples, interval, max_gap=None):
+    """Восстановление ряда с шагом interval из записи только изменений
+
+    samples - (timestamp, device, value) в порядке времени для каждого
+    устройства. Между соседними записями устройства значение повторяется
+    с шагом interval. Промежутки длиннее max_gap считаются отсутствием
+    данных (например, обрывом связи) и не заполняются; для записи
+    ChangeRecorder подходит max_gap = heartbeat + interval.
+    """
+    last = {}
+    for timestamp, device, value in samples:
+        previous = last.get(device)
+        if previous is not None:
+            start, held = previous
+            gap = timestamp - start
+            if max_gap is None or gap <= max_gap:
+                steps = int(round(gap / interval))
+                for step in range(1, steps):
+                    yield start + step * interval, device, held
+        last[device] = (timestamp, value)
+        yield timestamp, device, value
@@ -0,0 +1,121 @@
+import collections
+import re
+import threading
+import time
+
+
+# Значение, которое контроллер возвращает при ошибке датчика
+SENSOR_ERROR = -1000
+
+Temperature = collections.namedtuple("Temperature", "value")
+Thresholds = collections.namedtuple("Thresholds", "low high")
+NetworkSettings = collections.namedtuple("NetworkSettings", "ip gateway")
+
+NUMBER = r"(-?\d+(?:\.\d+)?)"
+TEMPERATURE_RE = re.compile(r"Temperature:\s*" + NUMBER)
+THRESHOLDS_RE = re.compile(r"Low:\s*" + NUMBER + r".*?High:\s*" + NUMBER, re.IGNORECASE)
+NUMBERS_RE = re.compile(NUMBER)
+NETWORK_RE = re.compile(r"IP:\s*([\d.]+)\s*,\s*Gateway:\s*([\d.]+)")
+
+
+def parse_temperature(response):
+    """Значение температуры из ответа 'Temperature: 22 C' или None"""
+    match = TEMPERATURE_RE.search(response)
+    return float(match.group(1)) if match else None
+
+
+def parse_thresholds(response):
+    """Пороги (low, high) из ответа на команду 9 или None"""
+    match = THRESHOLDS_RE.search(response)
+    if match:
+        return Thresholds(float(match.group(1)), float(match.group(2)))
+    # Запасной вариант для другого текста ответа: два последних числа
+    numbers = NUMBERS_RE.findall(response)
+    if len(numbers) >= 2 and not response.startswith("Ошибка"):
+        return Thresholds(float(numbers[-2]), float(numbers[-1]))
+    return None
+
+
+def parse_network(response):
+    """Настройки сети из ответа 'Current network settings - IP: ..., Gateway: ...'"""
+    match = NETWORK_RE.search(response)
+    return NetworkSettings(match.group(1), match.group(2)) if match else None
+
+
+def parse_ack(response):
+    """Подтверждение команды записи: True для OK, False для ERR, иначе None"""
+    if response == "OK":
+        return True
+    if response == "ERR":
+        return False
+    return None
+
+
+def command_code(command):
+    return command.split(" ", 1)[0]
+
+
+def parse_response(command, response):
+    """Типизированный ответ на команду или None, если ответ не распознан"""
+    code = command_code(command)
+    if code == "3":
+        value = parse_temperature(response)
+        return None if value is None else Temperature(value)
+    if code == "9":
+        return parse_thresholds(response)
+    if code == "11":
+        return parse_network(response)
+    return parse_ack(response)
+
+
+def format_temperature(value):
+    if value is None:
+        return "---"
+    if value == SENSOR_ERROR:
+        return "Ошибка датчика"
+    return f"{value:g} °C"
+
+
+class ResponseCache:
+    """Кэш ответов на команды чтения с коротким временем жизни
+
+    Кэшируются только успешные ответы на 9 и 11. Команда 8 сбрасывает
+    запись для 9, команда 10 - для 11.
+    """
+
+    CACHED = {"9", "11"}
+    INVALIDATES = {"8": ("9",), "10": ("11",)}
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, command):
+        if command not in self.CACHED or self.ttl <= 0:
+            return None
+        with self.lock:
+            entry = self.entries.get(command)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, command, response):
+        if command in self.CACHED and parse_response(command, response) is not None:
+            with self.lock:
+                self.entries[command] = (time.monotonic() + self.ttl, response)
+
+    def invalidate(self, command):
+        stale = self.INVALIDATES.get(command_code(command))
+        if stale:
+            with self.lock:
+                for code in stale:
+                    self.entries.pop(code, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
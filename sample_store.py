@@ -0,0 +1,246 @@
+import argparse
+import array
+import bisect
+import datetime
+import mmap
+import os
+import re
+import struct
+import threading
+
+from log_writer import open_log
+from recording import expand
+from responses import parse_temperature
+
+
+# Запись: время (unix, float64), номер устройства (uint32), значение (float32)
+RECORD = struct.Struct("<dIf")
+# Элемент индекса на блок записей: минимальное и максимальное время блока
+INDEX_ENTRY = struct.Struct("<dd")
+BLOCK_RECORDS = 1024
+
+LOG_SAMPLE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(.*)$")
+
+
+class SampleStore:
+    """Двоичное хранилище отсчетов температуры с индексом по времени
+
+    Данные хранятся в трех файлах рядом с base: .samples - записи
+    фиксированной длины только на дозапись, .idx - время начала и конца
+    каждого блока из BLOCK_RECORDS записей, .devices - имена устройств по
+    номерам. Запрос диапазона времени читает через mmap только блоки,
+    пересекающие диапазон.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.data_path = base + ".samples"
+        self.index_path = base + ".idx"
+        self.devices_path = base + ".devices"
+        self.lock = threading.Lock()
+
+        self.devices = []
+        if os.path.exists(self.devices_path):
+            with open(self.devices_path, encoding="utf-8") as f:
+                self.devices = [line.rstrip("\n") for line in f]
+        self.device_ids = {name: i for i, name in enumerate(self.devices)}
+
+        self.data_file = open(self.data_path, "ab")
+        self.count = self.data_file.tell() // RECORD.size
+        # Обрезанная при сбое последняя запись отбрасывается
+        if self.data_file.tell() != self.count * RECORD.size:
+            self.data_file.truncate(self.count * RECORD.size)
+
+        self.block_min = array.array("d")
+        self.block_max = array.array("d")
+        # Монотонность границ блоков проверяется отдельно: придержанные
+        # ChangeRecorder отсчеты пишутся позже и опускают минимум блока
+        self.index_sorted = True
+        self.min_sorted = True
+        self.load_index()
+        self.index_file = open(self.index_path, "ab")
+        self.pending_min = None
+        self.pending_max = None
+        self.rebuild_tail()
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        full_blocks = self.count // BLOCK_RECORDS
+        with open(self.index_path, "rb") as f:
+            raw = f.read(full_blocks * INDEX_ENTRY.size)
+        raw = raw[:len(raw) - len(raw) % INDEX_ENTRY.size]
+        for lo, hi in INDEX_ENTRY.iter_unpack(raw):
+            self.add_block(lo, hi)
+        if len(raw) != os.path.getsize(self.index_path):
+            with open(self.index_path, "r+b") as f:
+                f.truncate(len(raw))
+
+    def rebuild_tail(self):
+        """Дописывание индекса для блоков, не попавших в него до сбоя"""
+        first = len(self.block_min) * BLOCK_RECORDS
+        if first >= self.count:
+            return
+        with open(self.data_path, "rb") as f:
+            f.seek(first * RECORD.size)
+            raw = f.read((self.count - first) * RECORD.size)
+        self.count = first
+        for timestamp, _, _ in RECORD.iter_unpack(raw):
+            self.track(timestamp)
+        self.index_file.flush()
+
+    def device_id(self, name):
+        device_id = self.device_ids.get(name)
+        if device_id is None:
+            device_id = len(self.devices)
+            self.devices.append(name)
+            self.device_ids[name] = device_id
+            with open(self.devices_path, "a", encoding="utf-8") as f:
+                f.write(name + "\n")
+        return device_id
+
+    def track(self, timestamp):
+        if self.pending_min is None:
+            self.pending_min = self.pending_max = timestamp
+        else:
+            self.pending_min = min(self.pending_min, timestamp)
+            self.pending_max = max(self.pending_max, timestamp)
+        self.count += 1
+        if self.count % BLOCK_RECORDS == 0:
+            self.add_block(self.pending_min, self.pending_max)
+            self.index_file.write(INDEX_ENTRY.pack(self.pending_min, self.pending_max))
+            self.pending_min = self.pending_max = None
+
+    def add_block(self, lo, hi):
+        if self.block_max and hi < self.block_max[-1]:
+            self.index_sorted = False
+        if self.block_min and lo < self.block_min[-1]:
+            self.min_sorted = False
+        self.block_min.append(lo)
+        self.block_max.append(hi)
+
+    def append(self, timestamp, device, value):
+        with self.lock:
+            self.data_file.write(RECORD.pack(timestamp, self.device_id(device), value))
+            self.track(timestamp)
+
+    def extend(self, samples):
+        """Добавление последовательности (timestamp, device, value)"""
+        with self.lock:
+            buffer = bytearray()
+            for timestamp, device, value in samples:
+                buffer += RECORD.pack(timestamp, self.device_id(device), value)
+                self.track(timestamp)
+            self.data_file.write(buffer)
+
+    def flush(self):
+        with self.lock:
+            self.data_file.flush()
+            self.index_file.flush()
+
+    def close(self):
+        self.flush()
+        self.data_file.close()
+        self.index_file.close()
+
+    def candidate_blocks(self, start, end):
+        """Номера блоков, время которых пересекает [start, end]"""
+        # Записи идут в порядке времени, поэтому индекс обычно отсортирован
+        # и границы находятся бинарным поиском; иначе проверяется каждый блок
+        first = bisect.bisect_left(self.block_max, start) if self.index_sorted else 0
+        for block in range(first, len(self.block_min)):
+            if self.min_sorted and self.block_min[block] > end:
+                return
+            if self.block_max[block] >= start and self.block_min[block] <= end:
+                yield block
+        if self.count % BLOCK_RECORDS:
+            yield len(self.block_min)
+
+    def query(self, start=float("-inf"), end=float("inf"), device=None):
+        """Отсчеты (timestamp, device, value) в диапазоне времени"""
+        self.flush()
+        with self.lock:
+            count = self.count
+            device_filter = None if device is None else self.device_ids.get(device, -1)
+            devices = list(self.devices)
+        if count == 0:
+            return
+        with open(self.data_path, "rb") as f:
+            with mmap.mmap(f.fileno(), count * RECORD.size, access=mmap.ACCESS_READ) as data:
+                for block in self.candidate_blocks(start, end):
+                    first = block * BLOCK_RECORDS
+                    last = min(count, first + BLOCK_RECORDS)
+                    chunk = data[first * RECORD.size:last * RECORD.size]
+                    for timestamp, device_id, value in RECORD.iter_unpack(chunk):
+                        if start <= timestamp <= end and (device_filter is None or device_id == device_filter):
+                            yield timestamp, devices[device_id], value
+
+
+def read_text_log(path, encoding="cp1251"):
+    """Отсчеты (timestamp, value) из файла *_temperature_log.txt (или .txt.gz, .txt.zst)"""
+    with open_log(path, encoding) as f:
+        for line in f:
+            match = LOG_SAMPLE_RE.match(line)
+            if not match:
+                continue
+            value = parse_temperature(match.group(2))
+            if value is None:
+                continue
+            timestamp = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+            yield timestamp, value
+
+
+def import_text_log(path, store, device):
+    """Импорт текстового лога температуры в хранилище, возвращает число отсчетов"""
+    count = 0
+    batch = []
+    for timestamp, value in read_text_log(path):
+        batch.append((timestamp, device, value))
+        if len(batch) >= 4096:
+            store.extend(batch)
+            count += len(batch)
+            batch = []
+    store.extend(batch)
+    store.flush()
+    return count + len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранилище отсчетов температуры")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="импорт *_temperature_log.txt[.gz|.zst]")
+    import_parser.add_argument("store", help="базовое имя файлов хранилища")
+    import_parser.add_argument("logs", nargs="+")
+    import_parser.add_argument("--device", default="device", help="имя устройства для отсчетов")
+
+    query_parser = commands.add_parser("query", help="выборка по диапазону времени")
+    query_parser.add_argument("store")
+    query_parser.add_argument("--start", help="YYYY-MM-DD HH:MM:SS")
+    query_parser.add_argument("--end", help="YYYY-MM-DD HH:MM:SS")
+    query_parser.add_argument("--device")
+    query_parser.add_argument("--fill", type=float, metavar="INTERVAL",
+                              help="восстановить ряд с этим шагом из записи только изменений")
+    query_parser.add_argument("--max-gap", type=float, help="не заполнять промежутки длиннее, с")
+
+    args = parser.parse_args()
+    store = SampleStore(args.store)
+    try:
+        if args.command == "import":
+            for path in args.logs:
+                print(f"{path}: {import_text_log(path, store, args.device)}")
+        else:
+            start = datetime.datetime.fromisoformat(args.start).timestamp() if args.start else float("-inf")
+            end = datetime.datetime.fromisoformat(args.end).timestamp() if args.end else float("inf")
+            samples = store.query(start, end, args.device)
+            if args.fill:
+                samples = expand(samples, args.fill, args.max_gap)
+            for timestamp, device, value in samples:
+                moment = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"{moment},{device},{value:g}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+
+
+class Job:
+    """Периодическая задача планировщика"""
+
+    def __init__(self, scheduler, func, interval, name):
+        self.scheduler = scheduler
+        self.func = func
+        # Интервал можно менять на ходу, он учитывается при следующем планировании
+        self.interval = interval
+        self.name = name
+        # Плановое время текущего запуска и номер действующей записи в куче
+        self.due = None
+        self.sequence = None
+        self.cancelled = False
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_error = None
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """Планировщик периодических задач на монотонных часах
+
+    Все таймеры лежат в одной куче и обслуживаются одним потоком, поэтому
+    тысячи задач не требуют тысяч потоков. Время следующего запуска
+    отсчитывается от планового, а не от фактического, так что задержки
+    не накапливаются; пропущенные запуски не догоняются. Сами задачи
+    выполняются в пуле потоков, и задача не запускается повторно, пока не
+    закончился ее предыдущий запуск.
+    """
+
+    def __init__(self, max_workers=8):
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="job"
+        )
+        self.thread = None
+
+    def every(self, interval, func, name=None, delay=None):
+        """Запуск func каждые interval секунд; первый запуск через delay"""
+        job = Job(self, func, interval, name or getattr(func, "__name__", "job"))
+        due = time.monotonic() + (interval if delay is None else delay)
+        with self.condition:
+            self.push(due, job)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="scheduler")
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+        return job
+
+    def push(self, due, job):
+        job.sequence = next(self.sequence)
+        heapq.heappush(self.heap, (due, job.sequence, job))
+
+    def set_interval(self, job, interval):
+        """Смена интервала с переносом уже запланированного запуска
+
+        Следующий запуск отсчитывается от планового времени текущего, так
+        что сокращение интервала действует сразу, а не через старый интервал.
+        """
+        with self.condition:
+            job.interval = interval
+            if job.cancelled or job.due is None:
+                return
+            # Прежняя запись в куче становится недействительной
+            self.push(job.due + interval, job)
+            self.condition.notify()
+
+    def next_job(self):
+        with self.condition:
+            while True:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                due, sequence, job = self.heap[0]
+                if job.cancelled or sequence != job.sequence:
+                    heapq.heappop(self.heap)
+                    continue
+                now = time.monotonic()
+                if due > now:
+                    self.condition.wait(due - now)
+                    continue
+                heapq.heappop(self.heap)
+                job.due = due
+                next_due = due + job.interval
+                if next_due <= now:
+                    next_due += ((now - next_due) // job.interval + 1) * job.interval
+                self.push(next_due, job)
+                return job
+
+    def run(self):
+        while True:
+            job = self.next_job()
+            if job.running:
+                job.skipped += 1
+                continue
+            job.running = True
+            try:
+                self.pool.submit(self.execute, job)
+            except RuntimeError:
+                # Пул остановлен при завершении интерпретатора
+                return
+
+    def execute(self, job):
+        try:
+            job.func()
+            job.runs += 1
+        except Exception as e:
+            job.errors += 1
+            job.last_error = e
+        finally:
+            job.running = False
+
+    def jobs(self):
+        with self.condition:
+            return [job for _, sequence, job in self.heap if not job.cancelled and sequence == job.sequence]
+
+
+default_scheduler = Scheduler()
@@ -0,0 +1,217 @@
+import collections
+import random
+import threading
+import time
+
+from metrics import metrics
+from scheduler import default_scheduler
+
+
+# Команды, изменяющие состояние устройства; при обрыве они ставятся в очередь
+# и повторяются после переподключения. Запросы чтения (3, 9, 11) не копятся.
+QUEUED_COMMANDS = {"1", "2", "4", "5", "6", "7", "8", "10"}
+
+CLOSED = "closed"          # соединение есть, команды проходят
+RECONNECTING = "reconnecting"
+OPEN = "open"              # серия неудач, попытки приостановлены
+HALF_OPEN = "half_open"    # пробная попытка после паузы
+
+
+class SessionManager:
+    """Сессия с устройством с автоматическим переподключением
+
+    Фоновый поток следит за соединением TelnetClient: при обрыве выполняет
+    переподключение с экспоненциальной задержкой и случайным разбросом,
+    после failure_threshold неудач подряд размыкает цепь на open_time секунд.
+    Команды записи, поступившие без связи, повторяются после переподключения.
+    Проверка простоя выполняется общим планировщиком: команда 11 отправляется
+    только если от устройства ничего не приходило keepalive_idle секунд.
+    Команда или keepalive без ответа считаются обрывом связи.
+    """
+
+    def __init__(self, client, on_event=None, on_state=None, base_delay=1.0, max_delay=60.0,
+                 failure_threshold=8, open_time=300.0, keepalive_idle=28.0, max_queue=100,
+                 scheduler=None):
+        self.client = client
+        self.on_event = on_event
+        self.on_state = on_state
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.open_time = open_time
+        self.keepalive_idle = keepalive_idle
+        self.scheduler = scheduler or default_scheduler
+        self.keepalive_job = None
+        self.queue = collections.deque(maxlen=max_queue)
+        self.host = None
+        self.port = None
+        self.state = RECONNECTING
+        self.failures = 0
+        self.reconnects = 0
+        self.active = False
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    @property
+    def connected(self):
+        conn = self.client.conn
+        return self.client.connected and conn is not None and not conn.closed
+
+    def event(self, message):
+        if self.on_event:
+            self.on_event(message)
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_state:
+                self.on_state(state)
+
+    def start(self, host, port):
+        """Первое подключение и запуск фонового контроля соединения"""
+        self.stop()
+        self.host = host
+        self.port = port
+        self.failures = 0
+        result = self.client.connect(host, port)
+        self.set_state(CLOSED if self.client.connected else RECONNECTING)
+        self.active = True
+        self.wakeup.clear()
+        self.thread = threading.Thread(target=self.supervise)
+        self.thread.daemon = True
+        self.thread.start()
+        self.keepalive_job = self.scheduler.every(
+            min(5.0, self.keepalive_idle / 4),
+            self.keepalive_tick,
+            name=f"keepalive {host}:{port}"
+        )
+        return result
+
+    def stop(self):
+        self.active = False
+        if self.keepalive_job:
+            self.keepalive_job.cancel()
+            self.keepalive_job = None
+        self.wakeup.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        self.client.disconnect()
+
+    def send_command(self, command, use_cache=True):
+        if not self.connected:
+            return self.defer(command)
+        response = self.client.send_command(command, use_cache)
+        self.settle([command], [response])
+        return response
+
+    def send_commands(self, commands, timeout=None):
+        """Пакет команд одной записью; без связи и при обрыве - как send_command"""
+        if not self.connected:
+            return [self.defer(command) for command in commands]
+        responses = self.client.send_commands(commands, timeout)
+        self.settle(commands, responses)
+        return responses
+
+    def settle(self, commands, responses):
+        """Учет итога обмена: обрыв связи или подтверждение ответом"""
+        if not self.connected:
+            # Таймаут команды или keepalive тоже обрыв: клиент закрывает
+            # соединение, и неудача идет в счет размыкания цепи
+            self.link_failed()
+            for command, response in zip(commands, responses):
+                if response.startswith("Ошибка"):
+                    self.defer(command)
+        else:
+            # Связь подтверждена ответом, а не только подключением
+            self.failures = 0
+
+    def link_failed(self):
+        self.failures += 1
+        self.event("Соединение прервано")
+        self.set_state(RECONNECTING)
+        self.wakeup.set()
+
+    def defer(self, command):
+        if command.split(" ", 1)[0] in QUEUED_COMMANDS and self.active:
+            self.queue.append(command)
+            return "Не подключено, команда поставлена в очередь"
+        return "Не подключено"
+
+    def backoff_delay(self):
+        """Экспоненциальная задержка с разбросом (equal jitter)"""
+        delay = min(self.max_delay, self.base_delay * 2 ** min(self.failures, 16))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def idle_time(self):
+        return time.monotonic() - self.client.conn.last_activity
+
+    def keepalive_tick(self):
+        """Команда 11 только при простое канала, иначе трафик опроса уже держит связь"""
+        if not self.active:
+            return
+        if not self.connected:
+            self.wakeup.set()
+        elif self.idle_time() >= self.keepalive_idle:
+            # Keepalive должен дойти до устройства, кэш не используется
+            self.send_command("11", use_cache=False)
+
+    def supervise(self):
+        while self.active:
+            if self.connected:
+                # Обрыв замечают send_command и keepalive_tick
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            if self.failures >= self.failure_threshold and self.state != HALF_OPEN:
+                self.set_state(OPEN)
+                self.event(f"Устройство недоступно, следующая попытка через {self.open_time:.0f} с")
+                if self.wait(self.open_time):
+                    break
+                self.set_state(HALF_OPEN)
+            elif self.state != HALF_OPEN:
+                self.set_state(RECONNECTING)
+                delay = self.backoff_delay()
+                self.event(f"Переподключение к {self.host}:{self.port} через {delay:.1f} с")
+                if self.wait(delay):
+                    break
+
+            self.client.connect(self.host, self.port)
+            if self.connected:
+                # Счетчик неудач сбрасывает первый ответ на команду: устройство,
+                # которое принимает подключение, но не отвечает, тоже размыкает цепь
+                self.reconnects += 1
+                if metrics.enabled:
+                    metrics.inc("reconnects")
+                self.set_state(CLOSED)
+                self.event(f"Соединение восстановлено с {self.host}:{self.port}")
+                self.replay()
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN:
+                    self.set_state(OPEN)
+
+    def wait(self, delay):
+        """Пауза с прерыванием по stop(); True, если сессия остановлена"""
+        deadline = time.monotonic() + delay
+        while self.active:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.wakeup.wait(remaining)
+            self.wakeup.clear()
+        return True
+
+    def replay(self):
+        """Повтор команд, накопленных за время обрыва"""
+        if self.queue:
+            self.event(f"Повтор команд из очереди: {len(self.queue)}")
+        while self.queue and self.connected:
+            command = self.queue.popleft()
+            response = self.client.send_command(command)
+            self.event(f"Ответ ({command}): {response}")
+            if self.connected:
+                self.failures = 0
+            else:
+                self.link_failed()
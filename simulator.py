@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+
+
+WELCOME = (
+    "Control Server\r\n"
+    "Commands:\r\n"
+    "  1 - Enable signal power\r\n"
+    "  2 - Disable signal power\r\n"
+    "  3 - Show temperature\r\n"
+    "  4 - Enable auto fan control\r\n"
+    "  5 - Enable manual fan control\r\n"
+    "  6 - Turn fan on (manual mode)\r\n"
+    "  7 - Turn fan off (manual mode)\r\n"
+    "  8 X Y - Set temp thresholds (X=min, Y=max)\r\n"
+    "  9 - Get current temp thresholds\r\n"
+    "  10 IP GATEWAY - Set IP address and gateway\r\n"
+    "  11 - Get current network settings\r\n"
+)
+
+
+class SimulatorConfig:
+    """Параметры поведения имитируемых контроллеров (время в секундах)"""
+
+    def __init__(self, latency=0.0, jitter=0.0, prompt_delay=0.0, welcome_delay=0.0,
+                 drop_rate=0.0, silent_rate=0.0, sensor_error_rate=0.0,
+                 temperature=23.0, drift=0.05, seed=None):
+        self.latency = latency                  # задержка ответа
+        self.jitter = jitter                    # случайная добавка к задержке, 0..jitter
+        self.prompt_delay = prompt_delay        # пауза между текстом ответа и промптом
+        self.welcome_delay = welcome_delay      # пауза перед промптом приветствия
+        self.drop_rate = drop_rate              # вероятность разрыва соединения на команде
+        self.silent_rate = silent_rate          # вероятность не ответить на команду
+        self.sensor_error_rate = sensor_error_rate  # вероятность показания -1000
+        self.temperature = temperature
+        self.drift = drift                      # шаг случайного блуждания температуры
+        self.seed = seed
+
+
+class SimulatedController:
+    """Состояние одного контроллера и обработка его команд"""
+
+    def __init__(self, config, rng, ip="192.168.1.100"):
+        self.config = config
+        self.rng = rng
+        self.temperature = config.temperature + rng.uniform(-2, 2)
+        self.signal = False
+        self.fan_mode = "auto"
+        self.fan = False
+        self.low = 20
+        self.high = 30
+        self.ip = ip
+        self.gateway = "0.0.0.0"
+        self.commands = 0
+        self.connections = 0
+
+    def read_temperature(self):
+        self.temperature += self.rng.gauss(0, self.config.drift)
+        if self.rng.random() < self.config.sensor_error_rate:
+            return -1000
+        return round(self.temperature)
+
+    def handle(self, line):
+        parts = line.split()
+        if not parts:
+            return None
+        self.commands += 1
+        code, args = parts[0], parts[1:]
+        if code == "1" and not args:
+            self.signal = True
+        elif code == "2" and not args:
+            self.signal = False
+        elif code == "3" and not args:
+            return f"Temperature: {self.read_temperature()} C"
+        elif code == "4" and not args:
+            self.fan_mode = "auto"
+        elif code == "5" and not args:
+            self.fan_mode = "manual"
+        elif code in ("6", "7") and not args:
+            if self.fan_mode != "manual":
+                return "ERR"
+            self.fan = code == "6"
+        elif code == "8" and len(args) == 2:
+            try:
+                low, high = int(args[0]), int(args[1])
+            except ValueError:
+                return "ERR"
+            if low >= high:
+                return "ERR"
+            self.low, self.high = low, high
+        elif code == "9" and not args:
+            return f"Temp thresholds: Low: {self.low}, High: {self.high}"
+        elif code == "10" and len(args) == 2:
+            self.ip, self.gateway = args
+        elif code == "11" and not args:
+            return f"Current network settings - IP: {self.ip}, Gateway: {self.gateway}"
+        else:
+            return "ERR"
+        return "OK"
+
+
+class Simulator:
+    """Множество имитируемых контроллеров на локальных портах в одном цикле asyncio"""
+
+    def __init__(self, count=1, host="127.0.0.1", base_port=0, config=None):
+        self.count = count
+        self.host = host
+        self.base_port = base_port
+        self.config = config or SimulatorConfig()
+        self.rng = random.Random(self.config.seed)
+        self.controllers = []
+        self.servers = []
+        # Обработчики открытых соединений, снимаются при остановке
+        self.handlers = set()
+        self.ports = []
+        self.loop = None
+        self.thread = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        for i in range(self.count):
+            controller = SimulatedController(self.config, random.Random(self.rng.random()))
+            port = self.base_port + i if self.base_port else 0
+            server = await asyncio.start_server(
+                lambda r, w, c=controller: self.serve(c, r, w),
+                self.host, port
+            )
+            self.controllers.append(controller)
+            self.servers.append(server)
+            self.ports.append(server.sockets[0].getsockname()[1])
+        return self.ports
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+        for task in list(self.handlers):
+            task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def delay(self):
+        config = self.config
+        pause = config.latency + (self.rng.uniform(0, config.jitter) if config.jitter else 0)
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    async def serve(self, controller, reader, writer):
+        config = self.config
+        controller.connections += 1
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            writer.write(WELCOME.encode("ascii"))
+            if config.welcome_delay:
+                await writer.drain()
+                await asyncio.sleep(config.welcome_delay)
+            writer.write(b">")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = controller.handle(line.decode("ascii", errors="replace"))
+                if reply is None:
+                    continue
+                if self.rng.random() < config.drop_rate:
+                    break
+                if self.rng.random() < config.silent_rate:
+                    continue
+                await self.delay()
+                writer.write(f"\r\n{reply}\r\n".encode("ascii"))
+                if config.prompt_delay:
+                    await writer.drain()
+                    await asyncio.sleep(config.prompt_delay)
+                writer.write(b">")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+    def start_in_thread(self):
+        """Запуск в отдельном потоке (для бенчмарков), возвращает список портов"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="simulator")
+        self.thread.daemon = True
+        self.thread.start()
+        ready.wait()
+        return self.ports
+
+    def stop_thread(self):
+        if self.thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+
+    def fleet_config(self):
+        return [
+            {"name": f"sim{i}", "host": self.host, "port": port}
+            for i, port in enumerate(self.ports)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Имитатор контроллеров для нагрузочного тестирования")
+    parser.add_argument("--count", type=int, default=1, help="число контроллеров")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=20000, help="0 - случайные свободные порты")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--prompt-delay", type=float, default=0.0)
+    parser.add_argument("--welcome-delay", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--silent-rate", type=float, default=0.0)
+    parser.add_argument("--sensor-error-rate", type=float, default=0.0)
+    parser.add_argument("--temperature", type=float, default=23.0)
+    parser.add_argument("--drift", type=float, default=0.05)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--write-fleet", help="сохранить JSON со списком устройств для cli.py fleet")
+    args = parser.parse_args()
+
+    config = SimulatorConfig(
+        latency=args.latency, jitter=args.jitter, prompt_delay=args.prompt_delay,
+        welcome_delay=args.welcome_delay, drop_rate=args.drop_rate,
+        silent_rate=args.silent_rate, sensor_error_rate=args.sensor_error_rate,
+        temperature=args.temperature, drift=args.drift, seed=args.seed
+    )
+    simulator = Simulator(args.count, args.host, args.base_port, config)
+
+    async def run():
+        ports = await simulator.start()
+        if args.write_fleet:
+            with open(args.write_fleet, "w", encoding="utf-8") as f:
+                json.dump(simulator.fleet_config(), f, indent=1)
+        print(f"Запущено контроллеров: {len(ports)}, порты {ports[0]}-{ports[-1]}", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
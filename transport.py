@@ -0,0 +1,327 @@
+import collections
+import concurrent.futures
+import selectors
+import socket
+import threading
+import time
+
+
+PROMPT = b'>'
+
+# Управляющие байты протокола telnet
+IAC = 255
+DONT, DO, WONT, WILL = 254, 253, 252, 251
+SB, SE = 250, 240
+
+
+class PromptParser:
+    """Инкрементальный разбор входящего потока на ответы, завершенные промптом
+
+    Данные накапливаются в буфере по мере поступления, поиск промпта
+    продолжается с места предыдущей остановки, поэтому каждый байт
+    просматривается один раз. Служебные последовательности telnet (IAC)
+    вырезаются, на согласование опций формируется отказ.
+    """
+
+    def __init__(self, prompt=PROMPT):
+        self.prompt = prompt
+        self.buffer = bytearray()
+        self.scan_pos = 0
+        self.pending_iac = b''
+        self.negotiation = bytearray()
+
+    def feed(self, data):
+        if self.pending_iac or IAC in data:
+            data = self.strip_telnet(self.pending_iac + data)
+        self.buffer += data
+
+    def strip_telnet(self, data):
+        clean = bytearray()
+        i = 0
+        n = len(data)
+        self.pending_iac = b''
+        while i < n:
+            byte = data[i]
+            if byte != IAC:
+                clean.append(byte)
+                i += 1
+                continue
+            if i + 1 >= n:
+                self.pending_iac = bytes(data[i:])
+                break
+            cmd = data[i + 1]
+            if cmd == IAC:
+                clean.append(IAC)
+                i += 2
+            elif cmd in (DO, DONT, WILL, WONT):
+                if i + 2 >= n:
+                    self.pending_iac = bytes(data[i:])
+                    break
+                # Как и telnetlib, отказываемся от любых опций
+                if cmd in (DO, DONT):
+                    self.negotiation += bytes((IAC, WONT, data[i + 2]))
+                else:
+                    self.negotiation += bytes((IAC, DONT, data[i + 2]))
+                i += 3
+            elif cmd == SB:
+                end = data.find(bytes((IAC, SE)), i + 2)
+                if end < 0:
+                    self.pending_iac = bytes(data[i:])
+                    break
+                i = end + 2
+            else:
+                i += 2
+        return bytes(clean)
+
+    def take_negotiation(self):
+        data = bytes(self.negotiation)
+        self.negotiation.clear()
+        return data
+
+    def next_reply(self):
+        """Следующий полный ответ без промпта или None"""
+        pos = self.buffer.find(self.prompt, self.scan_pos)
+        if pos < 0:
+            self.scan_pos = len(self.buffer)
+            return None
+        reply = bytes(self.buffer[:pos])
+        del self.buffer[:pos + len(self.prompt)]
+        self.scan_pos = 0
+        return reply
+
+    def partial(self):
+        return bytes(self.buffer)
+
+
+class Connection:
+    """Неблокирующее соединение с одним устройством
+
+    Команды ставятся в очередь записи, каждому отправленному запросу
+    соответствует Future, который разрешается ответом в порядке отправки.
+    Первым ответом считается приветствие устройства (future welcome).
+    """
+
+    def __init__(self, loop, sock, prompt=PROMPT):
+        self.loop = loop
+        self.sock = sock
+        self.parser = PromptParser(prompt)
+        self.out = bytearray()
+        self.pending = collections.deque()
+        self.closed = False
+        self.error = None
+        self.welcome = concurrent.futures.Future()
+        self.pending.append(self.welcome)
+        # Время последнего приема данных от устройства, по нему определяется
+        # простой канала; отправка не в счет - устройство могло не ответить
+        self.last_activity = time.monotonic()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def submit(self, data):
+        """Постановка команды в очередь, возвращает Future ответа"""
+        future = concurrent.futures.Future()
+        self.loop.call_soon(self.enqueue, data, future)
+        return future
+
+    def submit_batch(self, items):
+        """Постановка нескольких команд подряд одной записью в сокет"""
+        futures = [concurrent.futures.Future() for _ in items]
+        self.loop.call_soon(self.enqueue_batch, items, futures)
+        return futures
+
+    def enqueue(self, data, future):
+        self.enqueue_batch((data,), (future,))
+
+    def enqueue_batch(self, items, futures):
+        if self.closed:
+            for future in futures:
+                future.set_exception(self.error or ConnectionError("Соединение закрыто"))
+            return
+        for data, future in zip(items, futures):
+            self.out += data
+            self.pending.append(future)
+        self.loop.update(self)
+
+    def handle_read(self):
+        try:
+            data = self.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.close(e)
+            return
+        if not data:
+            self.close(EOFError("Соединение закрыто устройством"))
+            return
+        self.last_activity = time.monotonic()
+        self.parser.feed(data)
+        negotiation = self.parser.take_negotiation()
+        if negotiation:
+            self.out += negotiation
+            self.loop.update(self)
+        while True:
+            reply = self.parser.next_reply()
+            if reply is None:
+                break
+            if not self.pending:
+                # Незапрошенный вывод устройства
+                continue
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_result(reply)
+
+    def handle_write(self):
+        try:
+            sent = self.sock.send(self.out)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.close(e)
+            return
+        del self.out[:sent]
+        if not self.out:
+            self.loop.update(self)
+
+    def wait_reply(self, future, timeout):
+        """Ожидание ответа; таймаут команды считается обрывом связи
+
+        Запрос без ответа остается в очереди первым, и следующий ответ
+        достался бы ему, а все последующие - предыдущим командам. Поэтому
+        по таймауту соединение закрывается с TimeoutError. Для приветствия,
+        как и в read_until, возвращается уже полученная часть, а его Future
+        остается в очереди первым: запоздавший промпт приветствия достанется
+        ему, а не первой команде.
+        """
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if future is self.welcome:
+                return self.parser.partial()
+            self.loop.call_soon(self.close, TimeoutError("нет ответа"))
+            raise TimeoutError("нет ответа") from None
+
+    def shutdown(self):
+        """Закрытие соединения из любого потока"""
+        self.loop.call_soon(self.close)
+
+    def close(self, error=None):
+        if self.closed:
+            return
+        self.closed = True
+        self.error = error
+        self.loop.unregister(self)
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error or ConnectionError("Соединение закрыто"))
+
+
+class TransportLoop:
+    """Один поток, обслуживающий любое количество соединений через selectors"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.calls = collections.deque()
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="transport-loop")
+                self.thread.daemon = True
+                self.thread.start()
+
+    def call_soon(self, func, *args):
+        """Выполнение функции в потоке цикла"""
+        self.calls.append((func, args))
+        if threading.current_thread() is not self.thread:
+            try:
+                self.wake_w.send(b'\0')
+            except (BlockingIOError, InterruptedError):
+                pass
+
+    def open_connection(self, host, port, timeout=5):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        conn = Connection(self, sock)
+        self.start()
+        self.call_soon(self.register, conn)
+        return conn
+
+    def register(self, conn):
+        self.selector.register(conn.sock, selectors.EVENT_READ, conn)
+
+    def update(self, conn):
+        """Подписка на запись, пока есть неотправленные данные"""
+        if conn.closed:
+            return
+        events = selectors.EVENT_READ
+        if conn.out:
+            events |= selectors.EVENT_WRITE
+        try:
+            self.selector.modify(conn.sock, events, conn)
+        except (KeyError, ValueError):
+            pass
+
+    def unregister(self, conn):
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+
+    def run(self):
+        while True:
+            for key, mask in self.selector.select():
+                conn = key.data
+                if conn is None:
+                    try:
+                        while self.wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, InterruptedError):
+                        pass
+                    continue
+                try:
+                    if mask & selectors.EVENT_READ:
+                        conn.handle_read()
+                    if mask & selectors.EVENT_WRITE and not conn.closed:
+                        conn.handle_write()
+                except Exception as e:
+                    self.fail(conn, e)
+            while self.calls:
+                func, args = self.calls.popleft()
+                try:
+                    func(*args)
+                except Exception as e:
+                    # Вызов относится к соединению: методу Connection или
+                    # методу цикла с соединением в аргументах
+                    target = getattr(func, "__self__", None)
+                    if not isinstance(target, Connection):
+                        target = next((a for a in args if isinstance(a, Connection)), None)
+                    if target is not None:
+                        self.fail(target, e)
+
+    def fail(self, conn, error):
+        """Непредвиденная ошибка закрывает только свое соединение, цикл продолжает работу"""
+        try:
+            conn.close(error)
+        except Exception:
+            pass
+
+
+default_loop = TransportLoop()
+
+
+def open_connection(host, port, timeout=5):
+    """Открытие соединения в общем для процесса цикле"""
+    return default_loop.open_connection(host, port, timeout)